@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import time
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
@@ -10,6 +10,7 @@ from ..auth import require_admin
 from ..db import get_db
 from ..models import Report, Seat
 from ..schemas import AnomalyOut, ReportOut, SeatOut
+from ..services.pipeline_stats import pipeline_stats
 from ..services.response_builder import (
 	build_anomaly_out,
 	build_seat_out,
@@ -94,3 +95,9 @@ def lock_seat(seat_id: str, minutes: int = 5, db: Session = Depends(get_db)) ->
 	db.refresh(seat)
 
 	return build_seat_out(seat)
+
+
+@router.get("/pipeline/stats", response_model=Dict[str, Dict[str, float]])
+def get_pipeline_stats() -> Dict[str, Dict[str, float]]:
+	"""Per-floor detection pipeline counters (e.g. motion-gated frame skip rates)."""
+	return pipeline_stats.snapshot()
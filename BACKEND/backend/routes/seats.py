@@ -9,12 +9,13 @@ from ..db import get_db
 from ..models import Seat
 from ..schemas import FloorSummary, SeatOut, SeatStatsOut
 from ..services.color import compute_floor_color
+from ..services.occupancy_stream import get_occupancy_stream
 from ..services.response_builder import (
 	build_seat_out,
 	build_seat_stats_out,
 	get_or_404,
 )
-from ..services.roi_loader import load_floor_config
+from ..services.roi_loader import get_floor_registry
 from ..services.yolo_service import refresh_floor
 
 router = APIRouter(prefix="", tags=["seats"])
@@ -69,8 +70,14 @@ def refresh_floor_endpoint(
 	floor: str,
 	db: Session = Depends(get_db),
 ) -> List[SeatOut]:
-	cfg = load_floor_config(floor)
-	seats = refresh_floor(db, cfg)
+	stream = get_occupancy_stream(floor)
+	if stream is not None:
+		# Continuous mode: write the stream's current decisions instead of sampling a burst
+		stream.flush(db)
+		seats = db.query(Seat).filter(Seat.floor_id == floor).all()
+	else:
+		cfg = get_floor_registry().get(floor)
+		seats = refresh_floor(db, cfg)
 	return [build_seat_out(s) for s in seats if s.floor_id == floor]
 
 
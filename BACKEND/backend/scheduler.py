@@ -8,8 +8,11 @@ from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
 
 from .db import SessionLocal
-from .services.roi_loader import list_floor_ids, load_floor_config
+from .services.roi_loader import get_floor_registry
 from .services.yolo_service import refresh_floor
+from .services.inference_queue import shutdown_inference_queue
+from .services.occupancy_stream import continuous_mode_enabled, start_occupancy_stream, stop_occupancy_stream, stop_occupancy_streams
+from .services.video_source import close_video_source, close_video_sources
 from .services.rollover import perform_rollovers_if_needed, export_daily_and_reset, export_monthly_and_reset_total, _date_from_ts, is_first_day
 
 
@@ -19,24 +22,36 @@ logger = logging.getLogger("scheduler")
 class FloorRefreshScheduler:
 	def __init__(self, interval_seconds: Optional[int] = None) -> None:
 		self.interval_seconds = interval_seconds or int(os.getenv("REFRESH_INTERVAL_SECONDS", "5"))
+		self.scan_seconds = int(os.getenv("FLOOR_CONFIG_SCAN_SECONDS", "30"))
 		self.scheduler = BackgroundScheduler()
+		self.registry = get_floor_registry()
+		# OCCUPANCY_MODE=continuous replaces interval refresh jobs with per-floor streams
+		self.continuous = continuous_mode_enabled()
+		self.floor_ids: set[str] = set()
 		self.started = False
 
 	def _refresh_job(self, floor_id: str) -> None:
 		db = SessionLocal()
 		try:
-			cfg = load_floor_config(floor_id)
+			cfg = self.registry.get(floor_id)
 			refresh_floor(db, cfg)
 		except Exception as e:
 			logger.exception("Error refreshing floor %s: %s", floor_id, e)
 		finally:
 			db.close()
 
-	def start(self) -> None:
-		if self.started:
+	def _sync_floors_job(self) -> None:
+		"""Add refresh jobs (or streams) for new floor configs and remove those of deleted ones."""
+		try:
+			current = set(self.registry.floor_ids())
+		except Exception:
+			logger.exception("Error scanning floor configs")
 			return
-		floors = list_floor_ids()
-		for floor_id in floors:
+		for floor_id in sorted(current - self.floor_ids):
+			if self.continuous:
+				start_occupancy_stream(floor_id, self.registry, SessionLocal)
+				logger.info("Started continuous occupancy for floor %s", floor_id)
+				continue
 			self.scheduler.add_job(
 				func=self._refresh_job,
 				args=[floor_id],
@@ -47,6 +62,32 @@ class FloorRefreshScheduler:
 				misfire_grace_time=30,
 				replace_existing=True,
 			)
+			logger.info("Scheduled refresh for floor %s", floor_id)
+		for floor_id in sorted(self.floor_ids - current):
+			if self.continuous:
+				stop_occupancy_stream(floor_id)
+			else:
+				try:
+					self.scheduler.remove_job(f"refresh_{floor_id}")
+				except Exception:
+					pass
+			close_video_source(floor_id)
+			logger.info("Removed refresh for floor %s", floor_id)
+		self.floor_ids = current
+
+	def start(self) -> None:
+		if self.started:
+			return
+		self._sync_floors_job()
+		# Pick up added/removed floor configs without a restart
+		self.scheduler.add_job(
+			func=self._sync_floors_job,
+			trigger=IntervalTrigger(seconds=self.scan_seconds),
+			id="sync_floors",
+			max_instances=1,
+			coalesce=True,
+			replace_existing=True,
+		)
 		# Daily midnight job (00:00:00 local time)
 		self.scheduler.add_job(
 			func=self._daily_rollover_job,
@@ -63,6 +104,9 @@ class FloorRefreshScheduler:
 		if self.started:
 			self.scheduler.shutdown(wait=False)
 			self.started = False
+		stop_occupancy_streams()
+		close_video_sources()
+		shutdown_inference_queue()
 
 	def _daily_rollover_job(self) -> None:
 		db = SessionLocal()
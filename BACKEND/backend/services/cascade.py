@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger("cascade")
+
+WEIGHTS_DIR = Path(__file__).resolve().parents[2] / "yolov11" / "weights"
+
+
+class Cascade:
+	"""
+	Two-stage detection: a small model on every frame, the full model only
+	where the small one may be wrong about a seat.
+
+	A frame is escalated when a person/object detection inside some seat ROI
+	scores below confidence. When a seat's hit ratio over the frames of one
+	call lies within margin of the presence threshold, every frame of the
+	call is escalated, since each of them counts toward that ratio.
+	"""
+
+	def __init__(self, threshold: float, confidence: float = 0.5, margin: float = 0.1) -> None:
+		self.threshold = threshold
+		self.confidence = confidence
+		self.margin = margin
+
+	def escalate(self, frame_dets: List[list], label_map, person_name: str, object_names: Iterable[str]) -> np.ndarray:
+		"""Bool mask of the frames to re-detect with the full model."""
+		object_names = set(object_names)
+		n = len(frame_dets)
+		person_hits = np.zeros((n, label_map.num_seats), dtype=bool)
+		object_hits = np.zeros((n, label_map.num_seats), dtype=bool)
+		uncertain = np.zeros(n, dtype=bool)
+		for k, dets in enumerate(frame_dets):
+			dets = [d for d in dets if d.cls_name == person_name or d.cls_name in object_names]
+			if not dets:
+				continue
+			in_seat = label_map.lookup(np.array([d.center for d in dets], dtype=np.float64))
+			is_person = np.array([d.cls_name == person_name for d in dets], dtype=bool)
+			scores = np.array([d.score for d in dets], dtype=np.float64)
+			person_hits[k] = in_seat[is_person].any(axis=0)
+			object_hits[k] = in_seat[~is_person].any(axis=0)
+			uncertain[k] = bool(((scores < self.confidence) & in_seat.any(axis=1)).any())
+		if n:
+			near = lambda r: np.abs(r - self.threshold) < self.margin
+			if near(person_hits.mean(axis=0)).any() or near(object_hits.mean(axis=0)).any():
+				uncertain[:] = True
+		return uncertain
+
+
+def cascade_enabled() -> bool:
+	return os.getenv("INFERENCE_CASCADE", "0") not in ("0", "false", "False", "")
+
+
+def fast_weights_path() -> Path:
+	"""CASCADE_FAST_WEIGHTS, relative paths resolved against yolov11/weights."""
+	path = Path(os.getenv("CASCADE_FAST_WEIGHTS", "yolo11n.pt"))
+	return path if path.is_absolute() else WEIGHTS_DIR / path
+
+
+_warned = False
+
+
+def get_cascade(threshold: float) -> Optional[Cascade]:
+	"""Cascade for INFERENCE_CASCADE=1, else None (full model on every frame)."""
+	global _warned
+	if not cascade_enabled():
+		return None
+	if not fast_weights_path().exists():
+		if not _warned:
+			logger.warning("Cascade disabled: fast model weights %s not found", fast_weights_path())
+			_warned = True
+		return None
+	try:
+		confidence = float(os.getenv("CASCADE_CONFIDENCE", "0.5"))
+	except Exception:
+		confidence = 0.5
+	try:
+		margin = float(os.getenv("CASCADE_MARGIN", "0.1"))
+	except Exception:
+		margin = 0.1
+	return Cascade(threshold, confidence=confidence, margin=margin)
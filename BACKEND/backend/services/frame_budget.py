@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class FrameBudget:
+	"""
+	Per-floor compute budget for one refresh.
+
+	Keeps an exponential moving average of the wall time one sampled frame
+	costs (decode wait, gates and inference together) and turns the budget
+	into a frame count: plan() picks that many frames spread evenly over the
+	source window. Until a first measurement exists the whole window is
+	planned and the refresh relies on the exhausted() guard.
+	"""
+
+	def __init__(self, budget_ms: float, min_frames: int = 4, alpha: float = 0.3) -> None:
+		self.budget_ms = float(budget_ms)
+		self.min_frames = max(1, int(min_frames))
+		self.alpha = alpha
+		self.ema_ms: Optional[float] = None
+
+	def frames_for(self, window: int) -> int:
+		if self.ema_ms is None or self.ema_ms <= 0:
+			return window
+		return int(np.clip(self.budget_ms // self.ema_ms, min(self.min_frames, window), window))
+
+	def plan(self, window: int) -> np.ndarray:
+		"""Sorted window indices to process this refresh."""
+		n = self.frames_for(window)
+		return np.unique(np.round(np.linspace(0, window - 1, n)).astype(np.int64))
+
+	def exhausted(self, elapsed_ms: float, processed: int) -> bool:
+		"""True once the budget is spent, as long as min_frames frames were processed."""
+		return processed >= self.min_frames and elapsed_ms >= self.budget_ms
+
+	def update(self, processed: int, elapsed_ms: float) -> None:
+		if processed <= 0:
+			return
+		per_frame = elapsed_ms / processed
+		if self.ema_ms is None:
+			self.ema_ms = per_frame
+		else:
+			self.ema_ms += self.alpha * (per_frame - self.ema_ms)
+
+
+_budgets: Dict[str, FrameBudget] = {}
+_budgets_lock = threading.Lock()
+
+
+def get_frame_budget(floor_id: str) -> Optional[FrameBudget]:
+	"""Per-floor budget, or None when REFRESH_BUDGET_MS is unset (process the full window)."""
+	try:
+		budget_ms = float(os.getenv("REFRESH_BUDGET_MS", "0"))
+	except Exception:
+		budget_ms = 0.0
+	if budget_ms <= 0:
+		return None
+	try:
+		min_frames = int(os.getenv("REFRESH_BUDGET_MIN_FRAMES", "4"))
+	except Exception:
+		min_frames = 4
+	with _budgets_lock:
+		budget = _budgets.get(floor_id)
+		if budget is None:
+			budget = FrameBudget(budget_ms, min_frames)
+			_budgets[floor_id] = budget
+		budget.budget_ms = budget_ms
+		budget.min_frames = max(1, min_frames)
+		return budget
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import abc
+import ast
+import hashlib
+import logging
+import os
+import warnings
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import torch
+
+
+logger = logging.getLogger("inference_backend")
+
+COMPILED_DIR = Path(__file__).resolve().parents[2] / "yolov11" / "weights" / "compiled"
+
+
+class InferenceBackend(abc.ABC):
+	"""
+	Runs the detection network on a preprocessed batch.
+
+	Backends load their model in __init__. warmup() runs dummy batches so
+	the first real request does not pay for lazy initialization. infer()
+	takes a float NCHW batch in [0, 1] and returns the raw
+	(N, 4 + classes, anchors) prediction that non_max_suppression consumes.
+	"""
+
+	name = "base"
+	# Device the input batch should live on, and whether the backend wants it in fp16
+	device = "cpu"
+	half = False
+	stride = 32
+	# Class index -> name stored with the model (class-pruned checkpoints), else None
+	names: Optional[Dict[int, str]] = None
+
+	def warmup(self, shape: Tuple[int, int] = (640, 640), batch: int = 1) -> None:
+		x = torch.zeros((batch, 3, shape[0], shape[1]), device=self.device)
+		self.infer(x.half() if self.half else x)
+
+	@abc.abstractmethod
+	def infer(self, x: torch.Tensor) -> torch.Tensor:
+		...
+
+
+class TorchBackend(InferenceBackend):
+	"""Eager PyTorch model from a nets.nn.YOLO checkpoint."""
+
+	name = "torch"
+
+	def __init__(self, weights: Path, device: str) -> None:
+		self.device = device
+		ckpt = torch.load(Path(weights).as_posix(), map_location=device, weights_only=False)
+		self.model = ckpt["model"].float().to(device)
+		self.names = ckpt.get("names")
+		self.half = device.startswith("cuda")
+		if self.half:
+			self.model.half()
+		self.model.eval()
+		self.stride = int(max(getattr(self.model, "stride", torch.tensor([32.0])).max().item(), 32))
+
+	@torch.no_grad()
+	def infer(self, x: torch.Tensor) -> torch.Tensor:
+		out = self.model(x)
+		return out[0] if isinstance(out, (list, tuple)) else out
+
+
+class _PredictionOnly(torch.nn.Module):
+	"""Drop the raw feature maps nets.nn.YOLO returns next to the prediction."""
+
+	def __init__(self, model: torch.nn.Module) -> None:
+		super().__init__()
+		self.model = model
+
+	def forward(self, x: torch.Tensor) -> torch.Tensor:
+		return self.model(x)[0]
+
+
+def _file_digest(path: Path) -> str:
+	h = hashlib.sha256()
+	with path.open("rb") as f:
+		for chunk in iter(lambda: f.read(1 << 20), b""):
+			h.update(chunk)
+	return h.hexdigest()[:16]
+
+
+class TorchScriptBackend(TorchBackend):
+	"""
+	Fused model traced to TorchScript per input shape.
+
+	Conv+BN pairs are fused once, then every (H, W) the detector uses is
+	traced, frozen and saved under cache_dir. The file name carries the
+	weights hash, torch version, device, dtype and shape, so restarted
+	workers load the artifact instead of tracing again. The batch size
+	stays dynamic. A shape that fails to trace or load runs eagerly.
+	"""
+
+	name = "torchscript"
+
+	def __init__(self, weights: Path, device: str, cache_dir: Path = COMPILED_DIR) -> None:
+		super().__init__(weights, device)
+		self.model.fuse()
+		self.cache_dir = Path(cache_dir)
+		self._key = f"{Path(weights).stem}-{_file_digest(Path(weights))}-torch{torch.__version__.replace('+', '-')}"
+		self._compiled: Dict[Tuple[int, int, torch.dtype], torch.nn.Module] = {}
+
+	def _artifact(self, shape: Tuple[int, int], dtype: torch.dtype) -> Path:
+		dtype_name = str(dtype).replace("torch.", "")
+		return self.cache_dir / f"{self._key}-{self.device.split(':')[0]}-{dtype_name}-{shape[0]}x{shape[1]}.ts"
+
+	def _compile(self, shape: Tuple[int, int], dtype: torch.dtype) -> torch.nn.Module:
+		path = self._artifact(shape, dtype)
+		if path.exists():
+			try:
+				return torch.jit.load(path.as_posix(), map_location=self.device)
+			except Exception as e:
+				logger.warning("Failed to load compiled model %s (%s); tracing again", path, e)
+		try:
+			example = torch.zeros((1, 3, shape[0], shape[1]), dtype=dtype, device=self.device)
+			with torch.no_grad(), warnings.catch_warnings():
+				warnings.simplefilter("ignore", torch.jit.TracerWarning)
+				traced = torch.jit.freeze(torch.jit.trace(_PredictionOnly(self.model).eval(), example, check_trace=False))
+			self.cache_dir.mkdir(parents=True, exist_ok=True)
+			# Write then rename, so concurrently starting workers never load a partial file
+			tmp = path.with_suffix(f".{os.getpid()}.tmp")
+			torch.jit.save(traced, tmp.as_posix())
+			os.replace(tmp, path)
+			logger.info("Compiled %s", path.name)
+			return traced
+		except Exception as e:
+			logger.warning("TorchScript compile for %sx%s failed (%s); running eagerly", shape[0], shape[1], e)
+			return _PredictionOnly(self.model).eval()
+
+	@torch.no_grad()
+	def infer(self, x: torch.Tensor) -> torch.Tensor:
+		key = (int(x.shape[2]), int(x.shape[3]), x.dtype)
+		module = self._compiled.get(key)
+		if module is None:
+			module = self._compile(key[:2], x.dtype)
+			self._compiled[key] = module
+		return module(x)
+
+
+class OnnxRuntimeBackend(InferenceBackend):
+	"""ONNX Runtime on the CPU execution provider (see tools/export_onnx.py)."""
+
+	name = "onnxruntime"
+
+	def __init__(self, model_path: Path, intra_op_threads: int = 0, inter_op_threads: int = 0) -> None:
+		import onnxruntime as ort
+
+		options = ort.SessionOptions()
+		options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+		# 0 keeps onnxruntime's default (one intra-op thread per physical core)
+		options.intra_op_num_threads = max(0, int(intra_op_threads))
+		options.inter_op_num_threads = max(0, int(inter_op_threads))
+		self.session = ort.InferenceSession(Path(model_path).as_posix(), options, providers=["CPUExecutionProvider"])
+		self.input_name = self.session.get_inputs()[0].name
+		meta = self.session.get_modelmeta().custom_metadata_map
+		self.stride = int(meta.get("stride", 32))
+		if "names" in meta:
+			self.names = ast.literal_eval(meta["names"])
+
+	def infer(self, x: torch.Tensor) -> torch.Tensor:
+		feed = np.ascontiguousarray(x.detach().cpu().numpy(), dtype=np.float32)
+		return torch.from_numpy(self.session.run(None, {self.input_name: feed})[0])
+
+
+def _env_int(name: str, default: int) -> int:
+	try:
+		return int(os.getenv(name, str(default)))
+	except Exception:
+		return default
+
+
+def load_backend(weights: Path, device: str, name: str | None = None) -> InferenceBackend:
+	"""
+	Backend named by name or INFERENCE_BACKEND (torch | torchscript |
+	onnxruntime). The ONNX model is the checkpoint path with an .onnx suffix,
+	or .int8.onnx with INFERENCE_PRECISION=int8 (see tools/quantize_int8.py);
+	when it or onnxruntime is missing the torch backend is used instead.
+	"""
+	name = (name or os.getenv("INFERENCE_BACKEND", "torch")).strip().lower()
+	weights = Path(weights)
+	if name == "onnxruntime":
+		int8 = os.getenv("INFERENCE_PRECISION", "fp32").strip().lower() == "int8"
+		model_path = weights if weights.suffix == ".onnx" else weights.with_suffix(".int8.onnx" if int8 else ".onnx")
+		if not model_path.exists():
+			tool = "tools/quantize_int8.py" if int8 else "tools/export_onnx.py"
+			logger.warning("ONNX model %s not found (create it with %s); using torch", model_path, tool)
+		else:
+			try:
+				return OnnxRuntimeBackend(
+					model_path,
+					intra_op_threads=_env_int("ORT_INTRA_OP_THREADS", 0),
+					inter_op_threads=_env_int("ORT_INTER_OP_THREADS", 0),
+				)
+			except ImportError:
+				logger.warning("onnxruntime is not installed; using torch")
+	elif name == "torchscript":
+		return TorchScriptBackend(weights, device, Path(os.getenv("COMPILED_CACHE_DIR", COMPILED_DIR.as_posix())))
+	elif name != "torch":
+		logger.warning("Unknown INFERENCE_BACKEND %r; using torch", name)
+	return TorchBackend(weights, device)
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .yolo_service import Detection
+
+
+logger = logging.getLogger("inference_pool")
+
+# (slot index, (h, w, c)) for every frame of a job
+FrameMeta = List[Tuple[int, Tuple[int, int, int]]]
+
+
+def _parse_frame_size(value: str) -> Tuple[int, int]:
+	w, h = value.lower().split("x")
+	return int(w), int(h)
+
+
+def _worker_main(shm_name: str, slots: int, slot_bytes: int, requests, results, threads: int) -> None:
+	"""
+	Inference worker process: attach to the frame ring, load the detector once and
+	serve jobs until a None sentinel arrives. Pixel data is read in place from
+	shared memory; only slot indices, shapes and detection tuples are pickled.
+	With the cascade enabled both stages stay resident and jobs name their stage.
+	"""
+	import torch
+	if threads > 0:
+		torch.set_num_threads(threads)
+
+	# Spawned workers share the parent's resource tracker, so the parent's unlink covers this attach
+	shm = shared_memory.SharedMemory(name=shm_name)
+	ring = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=shm.buf)
+
+	from .cascade import cascade_enabled, fast_weights_path
+	from .yolo_service import YOLODetector
+	detectors = {"full": YOLODetector()}
+	if cascade_enabled() and fast_weights_path().exists():
+		detectors["fast"] = YOLODetector(weights=fast_weights_path())
+
+	while True:
+		msg = requests.get()
+		if msg is None:
+			break
+		job_id, stage, metas = msg
+		try:
+			frames = [ring[slot, :h * w * c].reshape(h, w, c) for slot, (h, w, c) in metas]
+			dets = detectors[stage].detect_frames(frames)
+			payload = [[(d.x1, d.y1, d.x2, d.y2, d.score, d.cls_name) for d in ds] for ds in dets]
+			results.put((job_id, payload, None))
+		except Exception as e:
+			results.put((job_id, None, repr(e)))
+		finally:
+			frames = []
+
+	del ring
+	shm.close()
+
+
+class InferencePool:
+	"""
+	Pool of inference worker processes fed through a shared-memory frame ring.
+
+	The ring is one SharedMemory block split into fixed-size slots, each large
+	enough for a max_frame_size BGR frame. A job copies its frames into free
+	slots, sends (job_id, slot metadata) over a request queue, and a reader
+	thread resolves the job's future when a worker posts detections back.
+	"""
+
+	def __init__(
+		self,
+		workers: int = 2,
+		slots: int = 32,
+		max_frame_size: Tuple[int, int] = (1920, 1080),
+		threads_per_worker: int = 0,
+		timeout: float = 120.0,
+	) -> None:
+		self.workers = max(1, int(workers))
+		self.slots = max(1, int(slots))
+		self.max_frame_size = max_frame_size
+		self.slot_bytes = int(max_frame_size[0] * max_frame_size[1] * 3)
+		self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // self.workers)
+		self.timeout = timeout
+
+		self._ctx = mp.get_context("spawn")
+		self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+		self._ring = np.ndarray((self.slots, self.slot_bytes), dtype=np.uint8, buffer=self._shm.buf)
+		self._free: "queue.Queue[int]" = queue.Queue()
+		for i in range(self.slots):
+			self._free.put(i)
+		self._acquire_lock = threading.Lock()
+		self._job_ids = itertools.count()
+		self._pending: Dict[int, Tuple[Future, List[int]]] = {}
+		self._pending_lock = threading.Lock()
+		self._requests = self._ctx.Queue()
+		self._results = self._ctx.Queue()
+		self._procs: List[mp.process.BaseProcess] = []
+		self._stopped = False
+		self._start_workers()
+		self._reader = threading.Thread(target=self._read_results, name="inference-pool-reader", daemon=True)
+		self._reader.start()
+
+	def _start_workers(self) -> None:
+		self._procs = []
+		for i in range(self.workers):
+			p = self._ctx.Process(
+				target=_worker_main,
+				args=(self._shm.name, self.slots, self.slot_bytes, self._requests, self._results, self.threads_per_worker),
+				name=f"inference-worker-{i}",
+				daemon=True,
+			)
+			p.start()
+			self._procs.append(p)
+
+	def _acquire_slots(self, n: int) -> List[int]:
+		# Take all slots of a job under one lock so concurrent jobs cannot deadlock on a half-filled ring
+		with self._acquire_lock:
+			return [self._free.get() for _ in range(n)]
+
+	def _release_slots(self, slots: List[int]) -> None:
+		for slot in slots:
+			self._free.put(slot)
+
+	def submit(self, frames: List[np.ndarray], stage: str = "full") -> Future:
+		fut: Future = Future()
+		if self._stopped:
+			fut.set_exception(RuntimeError("inference pool is shut down"))
+			return fut
+		if len(frames) > self.slots:
+			raise ValueError(f"batch of {len(frames)} frames exceeds {self.slots} ring slots")
+		for frame in frames:
+			if frame.dtype != np.uint8 or frame.nbytes > self.slot_bytes:
+				raise ValueError(
+					f"frame {frame.shape} {frame.dtype} does not fit a ring slot of "
+					f"{self.max_frame_size[0]}x{self.max_frame_size[1]}x3 uint8"
+				)
+		slots = self._acquire_slots(len(frames))
+		metas: FrameMeta = []
+		for slot, frame in zip(slots, frames):
+			h, w = frame.shape[:2]
+			c = frame.shape[2] if frame.ndim == 3 else 1
+			self._ring[slot, :h * w * c].reshape(frame.shape)[...] = frame
+			metas.append((slot, (h, w, c)))
+		job_id = next(self._job_ids)
+		with self._pending_lock:
+			self._pending[job_id] = (fut, slots)
+		self._requests.put((job_id, stage, metas))
+		return fut
+
+	def detect_frames(self, frames: List[np.ndarray], stage: str = "full") -> List[List[Detection]]:
+		out: List[List[Detection]] = []
+		for start in range(0, len(frames), self.slots):
+			out.extend(self.submit(frames[start:start + self.slots], stage).result(timeout=self.timeout))
+		return out
+
+	def _read_results(self) -> None:
+		while not self._stopped:
+			try:
+				job_id, payload, error = self._results.get(timeout=1.0)
+			except queue.Empty:
+				self._check_workers()
+				continue
+			except (EOFError, OSError):
+				break
+			with self._pending_lock:
+				entry = self._pending.pop(job_id, None)
+			if entry is None:
+				continue
+			fut, slots = entry
+			self._release_slots(slots)
+			if error is not None:
+				fut.set_exception(RuntimeError(f"inference worker failed: {error}"))
+			else:
+				fut.set_result([[Detection(*t) for t in dets] for dets in payload])
+
+	def _check_workers(self) -> None:
+		if self._stopped or all(p.is_alive() for p in self._procs):
+			return
+		# A dead worker may have held jobs and may still be referenced by ring slots:
+		# restart the whole pool generation and fail every in-flight job.
+		logger.error("Inference worker died; restarting pool workers")
+		for p in self._procs:
+			if p.is_alive():
+				p.terminate()
+			p.join(timeout=5.0)
+		self._requests = self._ctx.Queue()
+		self._results = self._ctx.Queue()
+		with self._pending_lock:
+			pending = list(self._pending.values())
+			self._pending.clear()
+		for fut, slots in pending:
+			self._release_slots(slots)
+			if not fut.done():
+				fut.set_exception(RuntimeError("inference worker died"))
+		self._start_workers()
+
+	def shutdown(self) -> None:
+		if self._stopped:
+			return
+		self._stopped = True
+		for _ in self._procs:
+			self._requests.put(None)
+		for p in self._procs:
+			p.join(timeout=10.0)
+			if p.is_alive():
+				p.terminate()
+		self._reader.join(timeout=5.0)
+		with self._pending_lock:
+			for fut, _ in self._pending.values():
+				if not fut.done():
+					fut.set_exception(RuntimeError("inference pool is shut down"))
+			self._pending.clear()
+		del self._ring
+		self._shm.close()
+		self._shm.unlink()
+
+
+_pool: InferencePool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_inference_pool() -> InferencePool:
+	global _pool
+	with _pool_lock:
+		if _pool is None:
+			try:
+				workers = int(os.getenv("INFERENCE_WORKERS", "2"))
+			except Exception:
+				workers = 2
+			try:
+				slots = int(os.getenv("INFERENCE_POOL_SLOTS", "32"))
+			except Exception:
+				slots = 32
+			try:
+				max_frame_size = _parse_frame_size(os.getenv("INFERENCE_POOL_MAX_FRAME", "1920x1080"))
+			except Exception:
+				max_frame_size = (1920, 1080)
+			try:
+				threads = int(os.getenv("INFERENCE_WORKER_THREADS", "0"))
+			except Exception:
+				threads = 0
+			_pool = InferencePool(workers=workers, slots=slots, max_frame_size=max_frame_size, threads_per_worker=threads)
+		return _pool
+
+
+def shutdown_inference_pool() -> None:
+	global _pool
+	with _pool_lock:
+		if _pool is not None:
+			_pool.shutdown()
+			_pool = None
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger("inference_queue")
+
+
+@dataclass
+class _Request:
+	floor_id: str
+	frames: List[np.ndarray]
+	future: Future
+	results: List[Optional[list]] = field(default_factory=list)
+	pending: int = 0
+
+
+@dataclass
+class _Item:
+	request: _Request
+	index: int
+
+
+class InferenceQueue:
+	"""
+	Single inference service shared by all floor refresh jobs.
+
+	Floor jobs submit frames; worker threads group frames from different
+	floors into batches bounded by max_batch frames and max_wait_ms, run one
+	batched forward per group and hand each floor back its own detections.
+	`workers` > 1 keeps several batches in flight, which only helps when
+	run_batch dispatches to out-of-process workers.
+	"""
+
+	def __init__(
+		self,
+		run_batch: Callable[[List[np.ndarray]], List[list]],
+		max_batch: int = 8,
+		max_wait_ms: float = 10.0,
+		workers: int = 1,
+	) -> None:
+		self.run_batch = run_batch
+		self.max_batch = max(1, int(max_batch))
+		self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+		self._items: "queue.Queue[_Item | None]" = queue.Queue()
+		self._results_lock = threading.Lock()
+		self._threads = [
+			threading.Thread(target=self._worker, name=f"inference-queue-{i}", daemon=True)
+			for i in range(max(1, int(workers)))
+		]
+		self._stopped = False
+		for t in self._threads:
+			t.start()
+
+	def submit(self, floor_id: str, frames: List[np.ndarray]) -> Future:
+		"""
+		Enqueue frames of one floor; the future resolves to one detection list per frame.
+		"""
+		fut: Future = Future()
+		if self._stopped:
+			fut.set_exception(RuntimeError("inference queue is shut down"))
+			return fut
+		if not frames:
+			fut.set_result([])
+			return fut
+		req = _Request(floor_id=floor_id, frames=list(frames), future=fut)
+		req.results = [None] * len(req.frames)
+		req.pending = len(req.frames)
+		for i in range(len(req.frames)):
+			self._items.put(_Item(req, i))
+		return fut
+
+	def detect_frames(self, floor_id: str, frames: List[np.ndarray]) -> List[list]:
+		return self.submit(floor_id, frames).result()
+
+	def shutdown(self) -> None:
+		if self._stopped:
+			return
+		self._stopped = True
+		for _ in self._threads:
+			self._items.put(None)
+		for t in self._threads:
+			t.join(timeout=5.0)
+
+	def _collect(self, first: _Item) -> List[_Item]:
+		batch = [first]
+		deadline = time.monotonic() + self.max_wait
+		while len(batch) < self.max_batch:
+			timeout = deadline - time.monotonic()
+			try:
+				item = self._items.get(timeout=timeout) if timeout > 0 else self._items.get_nowait()
+			except queue.Empty:
+				break
+			if item is None:
+				# Put the stop marker back so the worker loop exits after this batch
+				self._items.put(None)
+				break
+			batch.append(item)
+		return batch
+
+	def _worker(self) -> None:
+		while True:
+			first = self._items.get()
+			if first is None:
+				break
+			batch = self._collect(first)
+			try:
+				outputs = self.run_batch([it.request.frames[it.index] for it in batch])
+			except Exception as e:
+				logger.exception("Batched inference failed: %s", e)
+				for it in batch:
+					if not it.request.future.done():
+						it.request.future.set_exception(e)
+				continue
+			with self._results_lock:
+				for it, dets in zip(batch, outputs):
+					req = it.request
+					if req.future.done():
+						continue
+					req.results[it.index] = dets
+					req.pending -= 1
+					if req.pending == 0:
+						req.future.set_result(req.results)
+
+		# Fail whatever is still queued so callers do not block forever
+		while True:
+			try:
+				item = self._items.get_nowait()
+			except queue.Empty:
+				break
+			if item is not None and not item.request.future.done():
+				item.request.future.set_exception(RuntimeError("inference queue is shut down"))
+
+
+_queues: Dict[str, InferenceQueue] = {}
+_queue_lock = threading.Lock()
+
+
+def get_inference_queue(stage: str = "full") -> InferenceQueue:
+	"""
+	Shared queue of one model: "full" (yolo11x) or "fast", the first stage of
+	the detection cascade. Each stage batches separately.
+	"""
+	with _queue_lock:
+		queue_ = _queues.get(stage)
+		if queue_ is None:
+			try:
+				max_batch = int(os.getenv("INFERENCE_MAX_BATCH", "8"))
+			except Exception:
+				max_batch = 8
+			try:
+				max_wait_ms = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+			except Exception:
+				max_wait_ms = 10.0
+			try:
+				pool_workers = int(os.getenv("INFERENCE_WORKERS", "0"))
+			except Exception:
+				pool_workers = 0
+			if pool_workers > 0:
+				# Forward passes run in worker processes; the API process never loads the model
+				from .inference_pool import get_inference_pool
+				pool = get_inference_pool()
+				run_batch = lambda frames: pool.detect_frames(frames, stage)
+				queue_ = InferenceQueue(run_batch, max_batch=max_batch, max_wait_ms=max_wait_ms, workers=pool.workers)
+			else:
+				from .yolo_service import get_detector, get_fast_detector
+				detector = get_fast_detector() if stage == "fast" else get_detector()
+				queue_ = InferenceQueue(detector.detect_frames, max_batch=max_batch, max_wait_ms=max_wait_ms)
+			_queues[stage] = queue_
+		return queue_
+
+
+def shutdown_inference_queue() -> None:
+	with _queue_lock:
+		queues = list(_queues.values())
+		_queues.clear()
+	for queue_ in queues:
+		queue_.shutdown()
+	from .inference_pool import shutdown_inference_pool
+	shutdown_inference_pool()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .roi_loader import CompiledFloorConfig
+
+
+class MotionGate:
+	"""
+	Cheap whole-frame change test run before YOLO.
+
+	Each frame is downscaled to a small grayscale image and differenced against
+	the last frame that was actually inferred, counting only pixels inside the
+	union of the floor's seat ROIs. When the changed fraction stays below
+	area_th, the detections of the last inferred frame are reused.
+	"""
+
+	def __init__(
+		self,
+		cfg: CompiledFloorConfig,
+		frame_size: Tuple[int, int],
+		width: int = 160,
+		pixel_th: int = 12,
+		area_th: float = 0.002,
+		max_skip: int = 300,
+	) -> None:
+		self.frame_size = (int(frame_size[0]), int(frame_size[1]))  # (w, h)
+		self.roi_key = cfg.roi_key
+		self.scale = min(1.0, width / float(self.frame_size[0]))
+		self.small_size = (
+			max(1, int(round(self.frame_size[0] * self.scale))),
+			max(1, int(round(self.frame_size[1] * self.scale))),
+		)
+		self.mask = np.zeros((self.small_size[1], self.small_size[0]), dtype=np.uint8)
+		polys = [np.round(p * self.scale).astype(np.int32).reshape(-1, 1, 2) for p in cfg.polygons]
+		cv2.fillPoly(self.mask, polys, 1)
+		self.mask_bool = self.mask.astype(bool)
+		self.mask_area = max(1, int(self.mask.sum()))
+		self.pixel_th = pixel_th
+		self.area_th = area_th
+		self.max_skip = max_skip
+
+		self.reference: Optional[np.ndarray] = None
+		self.last_dets: Optional[list] = None
+		self.skipped_in_row = 0
+
+	def small(self, frame: np.ndarray) -> np.ndarray:
+		gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+		return cv2.resize(gray, self.small_size, interpolation=cv2.INTER_AREA)
+
+	def changed_fraction(self, small: np.ndarray) -> float:
+		if self.reference is None:
+			return 1.0
+		diff = cv2.absdiff(small, self.reference)
+		return float(np.count_nonzero((diff > self.pixel_th) & self.mask_bool)) / self.mask_area
+
+	def plan(self, frames: List[np.ndarray]) -> Tuple[List[int], List[int]]:
+		"""
+		Decide which frames need inference.
+
+		Returns (infer_idx, source): infer_idx lists frames to run through YOLO and
+		source[i] is the index of the frame whose detections frame i uses, or -1
+		for the detections kept from an earlier call (self.last_dets).
+		"""
+		infer_idx: List[int] = []
+		source: List[int] = []
+		last = -1
+		for i, frame in enumerate(frames):
+			small = self.small(frame)
+			reusable = (last >= 0 or self.last_dets is not None) and self.skipped_in_row < self.max_skip
+			if reusable and self.changed_fraction(small) <= self.area_th:
+				self.skipped_in_row += 1
+				source.append(last)
+				continue
+			self.reference = small
+			self.skipped_in_row = 0
+			last = i
+			infer_idx.append(i)
+			source.append(i)
+		return infer_idx, source
+
+	def resolve(self, source: List[int], infer_idx: List[int], inferred: List[list]) -> List[list]:
+		"""Expand detections of inferred frames to every frame of the plan."""
+		by_frame = dict(zip(infer_idx, inferred))
+		out = [by_frame[src] if src >= 0 else self.last_dets for src in source]
+		if infer_idx:
+			self.last_dets = by_frame[infer_idx[-1]]
+		return out
+
+
+_gates: Dict[str, MotionGate] = {}
+
+
+def motion_gate_enabled() -> bool:
+	return os.getenv("MOTION_GATE", "1") not in ("0", "false", "False", "")
+
+
+def get_motion_gate(cfg: CompiledFloorConfig, frame_size: Tuple[int, int]) -> MotionGate:
+	"""Per-floor gate, rebuilt when the floor's ROIs or the frame size change."""
+	gate = _gates.get(cfg.floor_id)
+	if gate is None or gate.roi_key != cfg.roi_key or gate.frame_size != tuple(frame_size):
+		try:
+			area_th = float(os.getenv("MOTION_GATE_AREA", "0.002"))
+		except Exception:
+			area_th = 0.002
+		try:
+			pixel_th = int(os.getenv("MOTION_GATE_PIXEL", "12"))
+		except Exception:
+			pixel_th = 12
+		gate = MotionGate(cfg, frame_size, pixel_th=pixel_th, area_th=area_th)
+		_gates[cfg.floor_id] = gate
+	return gate
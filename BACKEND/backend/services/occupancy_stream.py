@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import Seat
+from .inference_queue import get_inference_queue
+from .motion_gate import motion_gate_enabled
+from .pipeline_stats import pipeline_stats
+from .roi_index import get_label_map
+from .roi_loader import CompiledFloorConfig, FloorConfigRegistry
+from .rollover import perform_rollovers_if_needed
+from .seat_classifier import get_seat_classifier
+from .tracker import make_tracker, tracking_enabled
+from .video_source import get_video_source
+from .yolo_service import (
+	MALICIOUS_SECONDS,
+	PRESENCE_RATIO,
+	_apply_seat_decisions,
+	_ensure_seats,
+	_infer_seat_hits,
+)
+
+
+logger = logging.getLogger("occupancy_stream")
+
+
+class SeatWindow:
+	"""
+	Per-seat person/object hits of the last `size` frames.
+
+	Ring buffers plus running sums keep push() and ratios() O(seats) per frame
+	regardless of the window length.
+	"""
+
+	def __init__(self, num_seats: int, size: int) -> None:
+		self.size = max(1, int(size))
+		self.person = np.zeros((self.size, num_seats), dtype=bool)
+		self.object = np.zeros((self.size, num_seats), dtype=bool)
+		self.person_sum = np.zeros(num_seats, dtype=np.int64)
+		self.object_sum = np.zeros(num_seats, dtype=np.int64)
+		self.pos = 0
+		self.count = 0
+
+	@property
+	def full(self) -> bool:
+		return self.count == self.size
+
+	def push(self, person_hits: np.ndarray, object_hits: np.ndarray) -> None:
+		if self.full:
+			self.person_sum -= self.person[self.pos]
+			self.object_sum -= self.object[self.pos]
+		else:
+			self.count += 1
+		self.person[self.pos] = person_hits
+		self.object[self.pos] = object_hits
+		self.person_sum += person_hits
+		self.object_sum += object_hits
+		self.pos = (self.pos + 1) % self.size
+
+	def ratios(self) -> tuple[np.ndarray, np.ndarray]:
+		n = max(1, self.count)
+		return self.person_sum / n, self.object_sum / n
+
+
+class OccupancyStream:
+	"""
+	Continuous occupancy tracking for one floor (OCCUPANCY_MODE=continuous).
+
+	A worker thread consumes the floor's stream at a low fixed rate, pushes the
+	per-seat hits of every frame into a SeatWindow and decides presence from
+	the windowed ratios with the usual PRESENCE_RATIO threshold. Seat rows are
+	only written for seats whose decision flipped, whose object-only timer
+	reaches MALICIOUS_SECONDS or whose lock expired, plus a periodic flush of
+	every seat that keeps the empty-time statistics current.
+	"""
+
+	def __init__(
+		self,
+		floor_id: str,
+		registry: FloorConfigRegistry,
+		session_factory: Callable[[], Session],
+		fps: float = 2.0,
+		window_seconds: float = 15.0,
+		flush_seconds: float = 60.0,
+	) -> None:
+		self.floor_id = floor_id
+		self.registry = registry
+		self.session_factory = session_factory
+		self.fps = max(0.1, float(fps))
+		self.window_size = max(1, int(round(window_seconds * self.fps)))
+		self.flush_seconds = flush_seconds
+
+		self.window: Optional[SeatWindow] = None
+		# Config (in decoded frame coordinates) the window was filled with
+		self._cfg: Optional[CompiledFloorConfig] = None
+		# Last decision written per seat as (person, object), plus the times a write is due anyway
+		self._written: Optional[np.ndarray] = None
+		self._malicious_due: Optional[np.ndarray] = None
+		self._lock_due: Optional[np.ndarray] = None
+		self._last_flush = 0.0
+		self.tracker = make_tracker() if tracking_enabled() else None
+		self._lock = threading.Lock()
+		self._stop = threading.Event()
+		self._thread = threading.Thread(target=self._run, name=f"occupancy-{floor_id}", daemon=True)
+
+	def start(self) -> None:
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stop.set()
+		self._thread.join(timeout=10.0)
+
+	def _run(self) -> None:
+		inference = get_inference_queue() if get_seat_classifier() is None else None
+		next_tick = time.monotonic()
+		while not self._stop.is_set():
+			try:
+				cfg = self.registry.get(self.floor_id)
+				source = get_video_source(self.floor_id, cfg.stream_path, sample_rate=self.fps)
+				frames = source.read(source.window) if source.is_opened() else []
+				source.finish_window()
+				if frames:
+					self._push(cfg.scaled(*source.scale), frames, inference)
+					self._write_due()
+			except Exception as e:
+				logger.exception("Occupancy stream for floor %s failed: %s", self.floor_id, e)
+				frames = []
+			# Pace files to real time; live streams are paced by the source
+			next_tick = max(next_tick + (len(frames) or 1) / self.fps, time.monotonic())
+			self._stop.wait(max(0.0, next_tick - time.monotonic()))
+
+	def _push(self, cfg: CompiledFloorConfig, frames: List[np.ndarray], inference) -> None:
+		frame_size = (frames[0].shape[1], frames[0].shape[0])
+		label_map = get_label_map(self.floor_id, cfg.polygons, frame_size, roi_key=cfg.roi_key)
+		person_hits, object_hits = _infer_seat_hits(cfg, frames, inference, label_map, motion_gate_enabled(), self.tracker)
+		with self._lock:
+			if self.window is None or self._cfg.roi_key != cfg.roi_key or self._cfg.seat_ids != cfg.seat_ids:
+				# Seats changed: start over and write every seat once the window is full
+				self.window = SeatWindow(cfg.num_seats, self.window_size)
+				self._written = None
+			self._cfg = cfg
+			for p, o in zip(person_hits, object_hits):
+				self.window.push(p, o)
+		pipeline_stats.incr(self.floor_id, "stream_frames", len(frames))
+
+	def _decisions(self) -> np.ndarray:
+		person_ratios, object_ratios = self.window.ratios()
+		return np.stack([person_ratios >= PRESENCE_RATIO, object_ratios >= PRESENCE_RATIO], axis=1)
+
+	def _write_due(self) -> None:
+		with self._lock:
+			if self.window is None or not self.window.full:
+				return
+			cfg = self._cfg
+			now = int(time.time())
+			decisions = self._decisions()
+			if self._written is None or time.monotonic() - self._last_flush >= self.flush_seconds:
+				mask = np.ones(cfg.num_seats, dtype=bool)
+			else:
+				mask = (decisions != self._written).any(axis=1) | (self._malicious_due <= now) | (self._lock_due <= now)
+			if mask.any():
+				self._write(cfg, decisions, mask, now)
+
+	def flush(self, db: Session) -> None:
+		"""Write the current decision of every seat now, using the caller's session."""
+		with self._lock:
+			if self.window is None or self.window.count == 0:
+				return
+			decisions = self._decisions()
+			self._write(self._cfg, decisions, np.ones(len(decisions), dtype=bool), int(time.time()), db)
+
+	def _write(self, cfg: CompiledFloorConfig, decisions: np.ndarray, mask: np.ndarray, now: int, db: Session | None = None) -> None:
+		own_session = db is None
+		db = db or self.session_factory()
+		try:
+			full = bool(mask.all())
+			if full:
+				try:
+					perform_rollovers_if_needed(db, now)
+				except Exception:
+					# best-effort; don't block detection
+					pass
+				by_id = _ensure_seats(db, cfg)
+			else:
+				ids = [cfg.seat_ids[i] for i in np.flatnonzero(mask)]
+				by_id = {s.seat_id: s for s in db.query(Seat).filter(Seat.floor_id == self.floor_id, Seat.seat_id.in_(ids)).all()}
+			idx = [i for i in np.flatnonzero(mask) if cfg.seat_ids[i] in by_id]
+			seats = [by_id[cfg.seat_ids[i]] for i in idx]
+			_apply_seat_decisions(db, seats, decisions[idx, 0], decisions[idx, 1], now)
+			db.commit()
+
+			if self._written is None:
+				n = cfg.num_seats
+				self._written = np.zeros((n, 2), dtype=bool)
+				self._malicious_due = np.full(n, np.inf)
+				self._lock_due = np.full(n, np.inf)
+			for i, seat in zip(idx, seats):
+				self._written[i] = decisions[i]
+				pending = seat.occupancy_start_ts and not seat.is_malicious
+				self._malicious_due[i] = seat.occupancy_start_ts + MALICIOUS_SECONDS if pending else np.inf
+				self._lock_due[i] = seat.lock_until_ts if seat.lock_until_ts > now else np.inf
+			if full:
+				self._last_flush = time.monotonic()
+				pipeline_stats.incr(self.floor_id, "stream_flushes")
+			pipeline_stats.incr(self.floor_id, "stream_seat_writes", len(seats))
+		finally:
+			if own_session:
+				db.close()
+
+
+_streams: Dict[str, OccupancyStream] = {}
+_streams_lock = threading.Lock()
+
+
+def continuous_mode_enabled() -> bool:
+	return os.getenv("OCCUPANCY_MODE", "interval").strip().lower() == "continuous"
+
+
+def start_occupancy_stream(floor_id: str, registry: FloorConfigRegistry, session_factory: Callable[[], Session]) -> OccupancyStream:
+	with _streams_lock:
+		stream = _streams.get(floor_id)
+		if stream is None:
+			try:
+				fps = float(os.getenv("CONTINUOUS_FPS", "2"))
+			except Exception:
+				fps = 2.0
+			try:
+				window_seconds = float(os.getenv("CONTINUOUS_WINDOW_SECONDS", "15"))
+			except Exception:
+				window_seconds = 15.0
+			try:
+				flush_seconds = float(os.getenv("CONTINUOUS_FLUSH_SECONDS", "60"))
+			except Exception:
+				flush_seconds = 60.0
+			stream = OccupancyStream(floor_id, registry, session_factory, fps, window_seconds, flush_seconds)
+			stream.start()
+			_streams[floor_id] = stream
+		return stream
+
+
+def get_occupancy_stream(floor_id: str) -> Optional[OccupancyStream]:
+	with _streams_lock:
+		return _streams.get(floor_id)
+
+
+def stop_occupancy_stream(floor_id: str) -> None:
+	with _streams_lock:
+		stream = _streams.pop(floor_id, None)
+	if stream is not None:
+		stream.stop()
+
+
+def stop_occupancy_streams() -> None:
+	with _streams_lock:
+		streams = list(_streams.values())
+		_streams.clear()
+	for stream in streams:
+		stream.stop()
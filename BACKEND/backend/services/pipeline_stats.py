@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import threading
+from typing import Dict
+
+
+class PipelineStats:
+	"""
+	Thread-safe per-floor counters and gauges for the detection pipeline
+	(frames skipped, inference calls saved, latencies, ...).
+	"""
+
+	def __init__(self) -> None:
+		self._values: Dict[str, Dict[str, float]] = {}
+		self._lock = threading.Lock()
+
+	def incr(self, floor_id: str, key: str, n: float = 1) -> None:
+		with self._lock:
+			floor = self._values.setdefault(floor_id, {})
+			floor[key] = floor.get(key, 0) + n
+
+	def set(self, floor_id: str, key: str, value: float) -> None:
+		with self._lock:
+			self._values.setdefault(floor_id, {})[key] = value
+
+	def get(self, floor_id: str, key: str, default: float = 0) -> float:
+		with self._lock:
+			return self._values.get(floor_id, {}).get(key, default)
+
+	def snapshot(self) -> Dict[str, Dict[str, float]]:
+		with self._lock:
+			return {floor_id: dict(values) for floor_id, values in sorted(self._values.items())}
+
+	def reset(self) -> None:
+		with self._lock:
+			self._values.clear()
+
+
+pipeline_stats = PipelineStats()
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+# Sub-pixel precision used when rasterizing polygons with cv2.fillPoly
+_SHIFT = 4
+
+
+class SeatLabelMap:
+	"""
+	Rasterized seat index map for one floor.
+
+	Each grid cell (cell x cell frame pixels) stores a bitmask of the seats whose
+	desk_roi covers it, so overlapping ROIs are supported. Looking up N points is
+	one NumPy gather plus an unpackbits, independent of the polygon complexity.
+	"""
+
+	def __init__(self, polygons: Sequence[Sequence[Sequence[float]]], frame_size: Tuple[int, int], cell: int = 2) -> None:
+		self.num_seats = len(polygons)
+		self.frame_size = (int(frame_size[0]), int(frame_size[1]))  # (w, h)
+		self.cell = max(1, int(cell))
+		width, height = self.frame_size
+		self.grid_w = (width + self.cell - 1) // self.cell
+		self.grid_h = (height + self.cell - 1) // self.cell
+		num_bytes = max(1, (self.num_seats + 7) // 8)
+		self.bits = np.zeros((self.grid_h, self.grid_w, num_bytes), dtype=np.uint8)
+
+		mask = np.zeros((self.grid_h, self.grid_w), dtype=np.uint8)
+		for k, poly in enumerate(polygons):
+			mask.fill(0)
+			# Cell centers sit at +0.5; shift so a cell is set when its center is inside
+			pts = np.round((np.asarray(poly, dtype=np.float64) / self.cell - 0.5) * (1 << _SHIFT)).astype(np.int32)
+			cv2.fillPoly(mask, [pts.reshape(-1, 1, 2)], 1, lineType=cv2.LINE_8, shift=_SHIFT)
+			self.bits[..., k // 8] |= mask << (k % 8)
+
+	def lookup(self, points: np.ndarray) -> np.ndarray:
+		"""
+		Map (N, 2) frame-coordinate points to an (N, num_seats) bool membership matrix.
+		Points outside the frame belong to no seat.
+		"""
+		points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+		if points.shape[0] == 0:
+			return np.zeros((0, self.num_seats), dtype=bool)
+		gx = np.floor(points[:, 0] / self.cell).astype(np.int64)
+		gy = np.floor(points[:, 1] / self.cell).astype(np.int64)
+		inside = (gx >= 0) & (gx < self.grid_w) & (gy >= 0) & (gy < self.grid_h)
+		cells = self.bits[np.clip(gy, 0, self.grid_h - 1), np.clip(gx, 0, self.grid_w - 1)]
+		cells[~inside] = 0
+		return np.unpackbits(cells, axis=1, count=self.num_seats, bitorder="little").astype(bool)
+
+	def seat_hits(self, points: np.ndarray) -> np.ndarray:
+		"""
+		Return a (num_seats,) bool array: True where at least one point falls in the seat ROI.
+		"""
+		return self.lookup(points).any(axis=0)
+
+
+_label_maps: Dict[Tuple, SeatLabelMap] = {}
+_label_maps_lock = threading.Lock()
+
+
+def _default_cell() -> int:
+	try:
+		return max(1, int(os.getenv("ROI_LABEL_CELL", "2")))
+	except Exception:
+		return 2
+
+
+def get_label_map(
+	floor_id: str,
+	polygons: Sequence[Sequence[Sequence[float]]],
+	frame_size: Tuple[int, int],
+	cell: int | None = None,
+	roi_key: Tuple | None = None,
+) -> SeatLabelMap:
+	"""
+	Return the cached label map for a floor config at a given frame size (w, h).
+	The cache key covers the polygons (or a precomputed roi_key), so edited
+	configs compile a fresh map.
+	"""
+	cell = cell or _default_cell()
+	if roi_key is None:
+		roi_key = tuple(tuple(tuple(float(v) for v in pt) for pt in poly) for poly in polygons)
+	key = (floor_id, roi_key, (int(frame_size[0]), int(frame_size[1])), cell)
+	with _label_maps_lock:
+		label_map = _label_maps.get(key)
+		if label_map is None:
+			# Drop maps compiled for older versions of this floor's config
+			for old_key in [k for k in _label_maps if k[0] == floor_id]:
+				del _label_maps[old_key]
+			label_map = SeatLabelMap(polygons, frame_size, cell)
+			_label_maps[key] = label_map
+		return label_map
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
 import json
+import threading
+from dataclasses import dataclass, replace
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -87,3 +91,144 @@ def list_floor_ids() -> list[str]:
 	return sorted([p.stem for p in FLOORS_DIR.glob("*.json")])
 
 
+
+
+@dataclass(frozen=True)
+class CompiledFloorConfig:
+	"""
+	Validated floor config in the form refresh_floor consumes directly.
+	Seat arrays are indexed like the config's seats list.
+	"""
+	floor_id: str
+	stream_path: str
+	frame_size: Optional[Tuple[int, int]]
+	seat_ids: Tuple[str, ...]
+	has_power: np.ndarray
+	polygons: Tuple[np.ndarray, ...]
+	bboxes: np.ndarray
+	roi_key: Tuple
+	raw: Dict[str, Any]
+	mtime_ns: int = 0
+
+	@property
+	def num_seats(self) -> int:
+		return len(self.seat_ids)
+
+	def crop_box(self, frame_size: Tuple[int, int], pad: int = 0) -> Tuple[int, int, int, int]:
+		"""
+		Union bounding box of all seat ROIs grown by pad pixels and clipped to
+		frame_size (w, h), as integer (x1, y1, x2, y2).
+		"""
+		width, height = int(frame_size[0]), int(frame_size[1])
+		x1 = int(np.floor(self.bboxes[:, 0].min())) - pad
+		y1 = int(np.floor(self.bboxes[:, 1].min())) - pad
+		x2 = int(np.ceil(self.bboxes[:, 2].max())) + pad
+		y2 = int(np.ceil(self.bboxes[:, 3].max())) + pad
+		x1, y1 = max(0, min(x1, width - 1)), max(0, min(y1, height - 1))
+		x2, y2 = max(x1 + 1, min(x2, width)), max(y1 + 1, min(y2, height))
+		return x1, y1, x2, y2
+
+	def scaled(self, sx: float, sy: float) -> "CompiledFloorConfig":
+		"""
+		Copy with the seat geometry mapped into frames resized by (sx, sy),
+		e.g. frames a video backend already decoded at a lower resolution.
+		"""
+		if sx == 1.0 and sy == 1.0:
+			return self
+		factor = np.array([sx, sy], dtype=np.float32)
+		polygons = tuple(p * factor for p in self.polygons)
+		frame_size = None
+		if self.frame_size is not None:
+			frame_size = (int(round(self.frame_size[0] * sx)), int(round(self.frame_size[1] * sy)))
+		return replace(
+			self,
+			frame_size=frame_size,
+			polygons=polygons,
+			bboxes=self.bboxes * np.tile(factor, 2),
+			roi_key=tuple(tuple(map(tuple, p.tolist())) for p in polygons),
+		)
+
+
+def normalize_stream_path(stream_path: str) -> str:
+	"""
+	Resolve a stream path relative to the project root; absolute paths are kept.
+	"""
+	path = Path(str(stream_path))
+	if not path.is_absolute():
+		path = BASE_DIR / path
+	return path.as_posix()
+
+
+def compile_floor_config(data: Dict[str, Any], mtime_ns: int = 0) -> CompiledFloorConfig:
+	"""
+	Validate a floor config dict and precompute seat index arrays, polygon arrays,
+	bounding boxes and the normalized stream path.
+	"""
+	validate_floor_config(data)
+	seats = data["seats"]
+	polygons = tuple(np.asarray(s["desk_roi"], dtype=np.float32) for s in seats)
+	bboxes = np.array(
+		[[p[:, 0].min(), p[:, 1].min(), p[:, 0].max(), p[:, 1].max()] for p in polygons],
+		dtype=np.float32,
+	)
+	frame_size = tuple(data["frame_size"]) if "frame_size" in data else None
+	return CompiledFloorConfig(
+		floor_id=data["floor_id"],
+		stream_path=normalize_stream_path(data["stream_path"]),
+		frame_size=frame_size,
+		seat_ids=tuple(s["seat_id"] for s in seats),
+		has_power=np.array([bool(s.get("has_power", 0)) for s in seats], dtype=bool),
+		polygons=polygons,
+		bboxes=bboxes,
+		roi_key=tuple(tuple(map(tuple, p.tolist())) for p in polygons),
+		raw=data,
+		mtime_ns=mtime_ns,
+	)
+
+
+class FloorConfigRegistry:
+	"""
+	Parses each config/floors/*.json once and keeps its compiled form.
+	An entry is recompiled when the file's mtime changes and dropped when the
+	file disappears, so callers always see the current set of floors.
+	"""
+
+	def __init__(self, floors_dir: Path = FLOORS_DIR) -> None:
+		self.floors_dir = floors_dir
+		self._entries: Dict[str, CompiledFloorConfig] = {}
+		self._lock = threading.Lock()
+
+	def get(self, floor_id: str) -> CompiledFloorConfig:
+		path = self.floors_dir / f"{floor_id}.json"
+		try:
+			mtime_ns = path.stat().st_mtime_ns
+		except FileNotFoundError:
+			with self._lock:
+				self._entries.pop(floor_id, None)
+			raise FileNotFoundError(f"Floor config not found: {path.as_posix()}")
+		with self._lock:
+			entry = self._entries.get(floor_id)
+			if entry is not None and entry.mtime_ns == mtime_ns:
+				return entry
+		with path.open("r", encoding="utf-8") as f:
+			data = json.load(f)
+		if "floor_id" not in data:
+			data["floor_id"] = floor_id
+		entry = compile_floor_config(data, mtime_ns)
+		with self._lock:
+			self._entries[floor_id] = entry
+		return entry
+
+	def floor_ids(self) -> list[str]:
+		ids = sorted(p.stem for p in self.floors_dir.glob("*.json")) if self.floors_dir.exists() else []
+		with self._lock:
+			for stale in set(self._entries) - set(ids):
+				del self._entries[stale]
+		return ids
+
+
+_registry = FloorConfigRegistry()
+
+
+def get_floor_registry() -> FloorConfigRegistry:
+	return _registry
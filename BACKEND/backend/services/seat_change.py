@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import os
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .roi_loader import CompiledFloorConfig
+
+
+# SSIM stabilizers for 8-bit intensities
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+class SeatChangeDetector:
+	"""
+	Per-seat change test against reference crops.
+
+	For every seat the desk ROI's bounding box is cropped, converted to
+	grayscale and resized to crop x crop pixels. A reference crop is stored at
+	the seat's last confident decision (empty or occupied), together with the
+	person/object state decided then. Each sampled frame is scored per seat with
+	a masked global SSIM ("SSIM-lite"); while no seat's 1 - SSIM exceeds the
+	threshold the frame needs no inference and every seat keeps its state.
+
+	Small objects barely move the score, so after max_skip skipped frames one
+	is inferred anyway, and seats whose inferred state disagrees with their
+	reference lose it (see invalidate) until they are confidently decided again.
+	"""
+
+	def __init__(
+		self,
+		cfg: CompiledFloorConfig,
+		frame_size: Tuple[int, int],
+		crop: int = 32,
+		threshold: float = 0.15,
+		max_skip: int = 10,
+	) -> None:
+		self.frame_size = (int(frame_size[0]), int(frame_size[1]))  # (w, h)
+		self.roi_key = cfg.roi_key
+		self.crop = crop
+		self.threshold = threshold
+		self.max_skip = max_skip
+		self.skipped_in_row = 0
+		width, height = self.frame_size
+
+		self.boxes: List[Tuple[int, int, int, int]] = []
+		masks = []
+		for poly, box in zip(cfg.polygons, cfg.bboxes):
+			x1 = int(np.clip(np.floor(box[0]), 0, width - 1))
+			y1 = int(np.clip(np.floor(box[1]), 0, height - 1))
+			x2 = int(np.clip(np.ceil(box[2]), x1 + 1, width))
+			y2 = int(np.clip(np.ceil(box[3]), y1 + 1, height))
+			self.boxes.append((x1, y1, x2, y2))
+			# Polygon mask in crop coordinates so only desk pixels are compared
+			sx, sy = crop / float(x2 - x1), crop / float(y2 - y1)
+			pts = np.round((poly - [x1, y1]) * [sx, sy]).astype(np.int32).reshape(-1, 1, 2)
+			mask = np.zeros((crop, crop), dtype=np.uint8)
+			cv2.fillPoly(mask, [pts], 1)
+			if not mask.any():
+				mask.fill(1)
+			masks.append(mask.reshape(-1).astype(np.float32))
+		self.weights = np.stack(masks)
+		self.weights /= self.weights.sum(axis=1, keepdims=True)
+
+		n = cfg.num_seats
+		self.refs: Optional[np.ndarray] = None
+		self.has_ref = np.zeros(n, dtype=bool)
+		self.ref_person = np.zeros(n, dtype=bool)
+		self.ref_object = np.zeros(n, dtype=bool)
+
+	def crops(self, frame: np.ndarray) -> np.ndarray:
+		"""(num_seats, crop * crop) float32 grayscale crops of one frame."""
+		gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+		out = np.empty((len(self.boxes), self.crop * self.crop), dtype=np.float32)
+		for k, (x1, y1, x2, y2) in enumerate(self.boxes):
+			out[k] = cv2.resize(gray[y1:y2, x1:x2], (self.crop, self.crop), interpolation=cv2.INTER_AREA).reshape(-1)
+		return out
+
+	def scores(self, crops: np.ndarray) -> np.ndarray:
+		"""Per-seat 1 - SSIM against the reference crop; inf where no reference exists."""
+		if self.refs is None:
+			return np.full(len(self.boxes), np.inf, dtype=np.float32)
+		w = self.weights
+		mx = (w * crops).sum(axis=1)
+		my = (w * self.refs).sum(axis=1)
+		dx = crops - mx[:, None]
+		dy = self.refs - my[:, None]
+		vx = (w * dx * dx).sum(axis=1)
+		vy = (w * dy * dy).sum(axis=1)
+		cov = (w * dx * dy).sum(axis=1)
+		ssim = ((2 * mx * my + _C1) * (2 * cov + _C2)) / ((mx * mx + my * my + _C1) * (vx + vy + _C2))
+		out = (1.0 - ssim).astype(np.float32)
+		out[~self.has_ref] = np.inf
+		return out
+
+	def changed(self, crops: np.ndarray) -> bool:
+		"""True when at least one seat's score crosses the threshold or max_skip frames were skipped (inference needed)."""
+		if self.skipped_in_row < self.max_skip and not (self.scores(crops) > self.threshold).any():
+			self.skipped_in_row += 1
+			return False
+		self.skipped_in_row = 0
+		return True
+
+	def invalidate(self, person: np.ndarray, obj: np.ndarray) -> None:
+		"""Drop the reference of seats whose inferred hits contradict their reference state."""
+		self.has_ref &= (person == self.ref_person) & (obj == self.ref_object)
+
+	def commit(self, crops: np.ndarray, confident: np.ndarray, person: np.ndarray, obj: np.ndarray) -> None:
+		"""Store crops and decided states as the new reference for confidently decided seats."""
+		if self.refs is None:
+			self.refs = crops.copy()
+		self.refs[confident] = crops[confident]
+		self.has_ref |= confident
+		self.ref_person[confident] = person[confident]
+		self.ref_object[confident] = obj[confident]
+
+
+_detectors: Dict[str, SeatChangeDetector] = {}
+
+
+def seat_change_enabled() -> bool:
+	# Opt-in until the threshold is tuned on real footage
+	return os.getenv("SEAT_CHANGE_GATE", "0") not in ("0", "false", "False", "")
+
+
+def get_seat_change_detector(cfg: CompiledFloorConfig, frame_size: Tuple[int, int]) -> SeatChangeDetector:
+	"""Per-floor detector, rebuilt (dropping references) when ROIs or frame size change."""
+	det = _detectors.get(cfg.floor_id)
+	if det is None or det.roi_key != cfg.roi_key or det.frame_size != tuple(frame_size):
+		try:
+			threshold = float(os.getenv("SEAT_CHANGE_THRESHOLD", "0.15"))
+		except Exception:
+			threshold = 0.15
+		try:
+			max_skip = int(os.getenv("SEAT_CHANGE_MAX_SKIP", "10"))
+		except Exception:
+			max_skip = 10
+		det = SeatChangeDetector(cfg, frame_size, threshold=threshold, max_skip=max_skip)
+		_detectors[cfg.floor_id] = det
+	return det
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+from .roi_loader import CompiledFloorConfig
+
+
+logger = logging.getLogger("seat_classifier")
+
+WEIGHTS_DIR = Path(__file__).resolve().parents[2] / "yolov11" / "weights"
+
+# Class indices of the crop classifier
+CLASSES = ("empty", "object", "person")
+EMPTY, OBJECT, PERSON = range(len(CLASSES))
+
+
+class SeatCropNet(torch.nn.Module):
+	"""Tiny CNN: four stride-2 conv blocks, global pooling and a linear head."""
+
+	def __init__(self, num_cls: int = len(CLASSES), width: Tuple[int, ...] = (16, 32, 64, 128)) -> None:
+		super().__init__()
+		layers = []
+		ch = 3
+		for out_ch in width:
+			layers += [
+				torch.nn.Conv2d(ch, out_ch, 3, 2, 1, bias=False),
+				torch.nn.BatchNorm2d(out_ch),
+				torch.nn.SiLU(inplace=True),
+				torch.nn.Conv2d(out_ch, out_ch, 3, 1, 1, groups=out_ch, bias=False),
+				torch.nn.BatchNorm2d(out_ch),
+				torch.nn.SiLU(inplace=True),
+			]
+			ch = out_ch
+		self.features = torch.nn.Sequential(*layers)
+		self.head = torch.nn.Linear(ch, num_cls)
+
+	def forward(self, x: torch.Tensor) -> torch.Tensor:
+		return self.head(self.features(x).mean(dim=(2, 3)))
+
+
+def _order_quad(quad: np.ndarray) -> np.ndarray:
+	"""Order 4 points as top-left, top-right, bottom-right, bottom-left."""
+	s = quad.sum(axis=1)
+	d = quad[:, 0] - quad[:, 1]
+	return np.array([quad[s.argmin()], quad[d.argmax()], quad[s.argmax()], quad[d.argmin()]], dtype=np.float32)
+
+
+class SeatWarper:
+	"""
+	Perspective warps of every seat's desk ROI to size x size crops.
+
+	Four-point ROIs are mapped corner to corner; other polygons use their
+	minimum-area rectangle. Each seat's bounding box is first shrunk with
+	INTER_AREA to about twice the crop size (warpPerspective has no area
+	filter), and the homography works on that shrunk box. Everything is
+	computed once per config and frame size.
+	"""
+
+	def __init__(self, cfg: CompiledFloorConfig, frame_size: Tuple[int, int], size: int = 64) -> None:
+		self.frame_size = (int(frame_size[0]), int(frame_size[1]))
+		self.roi_key = cfg.roi_key
+		self.size = size
+		dst = np.array([[0, 0], [size - 1, 0], [size - 1, size - 1], [0, size - 1]], dtype=np.float32)
+		width, height = self.frame_size
+		# Per seat: bbox (x1, y1, x2, y2), shrunk bbox size and homography from the shrunk bbox
+		self.boxes: List[Tuple[int, int, int, int]] = []
+		self.shrunk: List[Tuple[int, int] | None] = []
+		self.homographies: List[np.ndarray] = []
+		for poly, box in zip(cfg.polygons, cfg.bboxes):
+			x1 = int(np.clip(np.floor(box[0]), 0, width - 1))
+			y1 = int(np.clip(np.floor(box[1]), 0, height - 1))
+			x2 = int(np.clip(np.ceil(box[2]), x1 + 1, width))
+			y2 = int(np.clip(np.ceil(box[3]), y1 + 1, height))
+			f = min(1.0, 2.0 * size / max(x2 - x1, y2 - y1))
+			self.boxes.append((x1, y1, x2, y2))
+			self.shrunk.append((max(1, round((x2 - x1) * f)), max(1, round((y2 - y1) * f))) if f < 1.0 else None)
+			quad = poly if len(poly) == 4 else cv2.boxPoints(cv2.minAreaRect(poly.astype(np.float32)))
+			quad = (_order_quad(np.asarray(quad, dtype=np.float32)) - [x1, y1]) * f
+			self.homographies.append(cv2.getPerspectiveTransform(quad.astype(np.float32), dst))
+
+	def crops(self, frame: np.ndarray, out: np.ndarray) -> None:
+		"""Warp one BGR frame into out, a (num_seats, size, size, 3) uint8 array."""
+		for k, ((x1, y1, x2, y2), shrunk, m) in enumerate(zip(self.boxes, self.shrunk, self.homographies)):
+			region = frame[y1:y2, x1:x2]
+			if shrunk is not None:
+				region = cv2.resize(region, shrunk, interpolation=cv2.INTER_AREA)
+			cv2.warpPerspective(region, m, (self.size, self.size), dst=out[k], flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+class SeatClassifier:
+	"""Batched person / object-only / empty classification of seat crops."""
+
+	def __init__(self, weights: str | Path) -> None:
+		self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
+		ckpt = torch.load(Path(weights).as_posix(), map_location=self.device, weights_only=False)
+		self.model = ckpt["model"].float().to(self.device).eval()
+		self.size = int(ckpt.get("size", 64))
+		self._lock = threading.Lock()
+
+	@torch.no_grad()
+	def predict(self, crops: np.ndarray) -> np.ndarray:
+		"""Class index per (N, size, size, 3) BGR uint8 crop."""
+		if len(crops) == 0:
+			return np.zeros(0, dtype=np.int64)
+		with self._lock:
+			x = torch.from_numpy(np.ascontiguousarray(crops[..., ::-1])).to(self.device)
+			x = x.permute(0, 3, 1, 2).float() / 255
+			return self.model(x).argmax(dim=1).cpu().numpy()
+
+	def seat_hits(self, warper: SeatWarper, frames: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+		"""
+		Classify all seats of all frames in one forward and return (frames,
+		seats) person/object hit matrices like the detector pipeline. Person
+		crops usually show belongings too (the person label wins when the
+		classifier's training labels are bootstrapped), so every non-empty seat
+		counts as an object hit, as it would with the detector.
+		"""
+		n = len(warper.homographies)
+		crops = np.empty((len(frames) * n, self.size, self.size, 3), dtype=np.uint8)
+		for i, frame in enumerate(frames):
+			warper.crops(frame, crops[i * n:(i + 1) * n])
+		labels = self.predict(crops).reshape(len(frames), n)
+		return labels == PERSON, labels != EMPTY
+
+
+def classifier_engine_enabled() -> bool:
+	return os.getenv("OCCUPANCY_ENGINE", "detector").strip().lower() == "classifier"
+
+
+def classifier_weights_path() -> Path:
+	"""SEAT_CLASSIFIER_WEIGHTS, relative paths resolved against yolov11/weights."""
+	path = Path(os.getenv("SEAT_CLASSIFIER_WEIGHTS", "seat_classifier.pt"))
+	return path if path.is_absolute() else WEIGHTS_DIR / path
+
+
+_classifier: SeatClassifier | None = None
+_classifier_lock = threading.Lock()
+_warned = False
+_warpers: Dict[str, SeatWarper] = {}
+
+
+def get_seat_classifier() -> Optional[SeatClassifier]:
+	"""Classifier for OCCUPANCY_ENGINE=classifier, else None (detector engine)."""
+	global _classifier, _warned
+	if not classifier_engine_enabled():
+		return None
+	with _classifier_lock:
+		if _classifier is None:
+			path = classifier_weights_path()
+			if not path.exists():
+				if not _warned:
+					logger.warning("Seat classifier weights %s not found; using the detector engine", path)
+					_warned = True
+				return None
+			_classifier = SeatClassifier(path)
+	return _classifier
+
+
+def get_seat_warper(cfg: CompiledFloorConfig, frame_size: Tuple[int, int], size: int) -> SeatWarper:
+	"""Per-floor warper, rebuilt when ROIs, frame size or crop size change."""
+	warper = _warpers.get(cfg.floor_id)
+	if warper is None or warper.roi_key != cfg.roi_key or warper.frame_size != tuple(frame_size) or warper.size != size:
+		warper = SeatWarper(cfg, frame_size, size)
+		_warpers[cfg.floor_id] = warper
+	return warper
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def wilson_bounds(hits: np.ndarray, n: int, z: float) -> Tuple[np.ndarray, np.ndarray]:
+	"""Wilson score interval (lower, upper) of hit ratios hits / n."""
+	hits = np.asarray(hits, dtype=np.float64)
+	p = hits / n
+	z2 = z * z
+	denom = 1.0 + z2 / n
+	center = (p + z2 / (2.0 * n)) / denom
+	half = z * np.sqrt(p * (1.0 - p) / n + z2 / (4.0 * n * n)) / denom
+	return center - half, center + half
+
+
+class SequentialStop:
+	"""
+	Early stop for a refresh once every seat's decision is settled.
+
+	After each batch the per-seat person and object hit ratios are tested
+	against the presence threshold: a ratio is settled when its Wilson
+	confidence interval lies entirely on one side of the threshold, or when
+	the frames still planned for this refresh could no longer move it across.
+	Both ratios must be settled for every seat, since the occupancy timer
+	uses them separately.
+	"""
+
+	def __init__(self, threshold: float, z: float = 1.96, min_frames: int = 8) -> None:
+		self.threshold = threshold
+		self.z = z
+		self.min_frames = max(1, int(min_frames))
+
+	def _ratio_settled(self, hits: np.ndarray, n: int, planned: int) -> np.ndarray:
+		lo, hi = wilson_bounds(hits, n, self.z)
+		statistical = (lo >= self.threshold) | (hi < self.threshold)
+		# Exact: even all remaining frames (or none of them) would keep the decision
+		need = self.threshold * planned
+		exact = (hits >= need) | (hits + (planned - n) < need)
+		return statistical | exact
+
+	def settled(self, person_hits: np.ndarray, object_hits: np.ndarray, n: int, planned: int) -> bool:
+		if n < self.min_frames or n >= planned:
+			return False
+		return bool(self._ratio_settled(person_hits, n, planned).all() and self._ratio_settled(object_hits, n, planned).all())
+
+
+def get_sequential_stop(threshold: float) -> Optional[SequentialStop]:
+	"""SequentialStop for SEQUENTIAL_STOP=1, else None (always process the full sample)."""
+	if os.getenv("SEQUENTIAL_STOP", "0") in ("0", "false", "False", ""):
+		return None
+	try:
+		z = float(os.getenv("SEQUENTIAL_Z", "1.96"))
+	except Exception:
+		z = 1.96
+	try:
+		min_frames = int(os.getenv("SEQUENTIAL_MIN_FRAMES", "8"))
+	except Exception:
+		min_frames = 8
+	return SequentialStop(threshold, z=z, min_frames=min_frames)
@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass, replace
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+@dataclass
+class Track:
+	box: np.ndarray  # (4,) float x1, y1, x2, y2 in frame coordinates
+	score: float
+	cls_name: str
+	confidence: float = 1.0
+	age: int = 0
+
+	@property
+	def center(self) -> Tuple[float, float]:
+		return float(self.box[0] + self.box[2]) / 2.0, float(self.box[1] + self.box[3]) / 2.0
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+	"""Pairwise IoU of (N, 4) and (M, 4) xyxy boxes."""
+	if len(a) == 0 or len(b) == 0:
+		return np.zeros((len(a), len(b)), dtype=np.float32)
+	x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+	y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+	x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+	y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+	inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+	area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+	area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+	union = area_a[:, None] + area_b[None, :] - inter
+	return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+class BoxTracker:
+	"""
+	Keyframe detection with optical-flow box propagation.
+
+	Full detection runs on every keyframe_interval-th frame; boxes of the
+	frames in between are shifted by the median Lucas-Kanade flow of feature
+	points inside each box (computed on a downscaled grayscale frame). A
+	track's confidence is multiplied by the fraction of its points that
+	survive a forward-backward check, and the frame is re-detected as soon as
+	any track drops below min_confidence. Detections on keyframes are
+	associated with existing tracks by IoU so surviving tracks keep their age.
+	"""
+
+	def __init__(
+		self,
+		keyframe_interval: int = 4,
+		min_confidence: float = 0.5,
+		iou_th: float = 0.3,
+		flow_width: int = 640,
+		points_per_box: int = 16,
+		fb_error: float = 1.0,
+	) -> None:
+		self.keyframe_interval = max(1, int(keyframe_interval))
+		self.min_confidence = min_confidence
+		self.iou_th = iou_th
+		self.flow_width = flow_width
+		self.points_per_box = points_per_box
+		self.fb_error = fb_error
+		self.tracks: List[Track] = []
+		self._prev_gray: Optional[np.ndarray] = None
+		self._scale = 1.0
+		self._since_key = 0
+		self.keyframes = 0
+		self.redetects = 0
+
+	def _gray(self, frame: np.ndarray) -> np.ndarray:
+		gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+		self._scale = min(1.0, self.flow_width / float(gray.shape[1]))
+		if self._scale < 1.0:
+			gray = cv2.resize(gray, None, fx=self._scale, fy=self._scale, interpolation=cv2.INTER_AREA)
+		return gray
+
+	def _box_points(self, gray: np.ndarray, box: np.ndarray) -> np.ndarray:
+		"""Feature points inside a (downscaled) box, falling back to a grid on flat regions."""
+		h, w = gray.shape[:2]
+		x1, y1 = int(np.clip(box[0], 0, w - 1)), int(np.clip(box[1], 0, h - 1))
+		x2, y2 = int(np.clip(np.ceil(box[2]), x1 + 1, w)), int(np.clip(np.ceil(box[3]), y1 + 1, h))
+		pts = None
+		if x2 - x1 >= 8 and y2 - y1 >= 8:
+			pts = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], self.points_per_box, 0.01, 3)
+		if pts is None or len(pts) < 4:
+			gx, gy = np.meshgrid(np.linspace(x1, x2 - 1, 4), np.linspace(y1, y2 - 1, 4))
+			return np.stack([gx.ravel(), gy.ravel()], axis=1).astype(np.float32)
+		return pts.reshape(-1, 2) + np.array([x1, y1], dtype=np.float32)
+
+	def _propagate(self, gray: np.ndarray) -> None:
+		if not self.tracks or self._prev_gray is None:
+			return
+		boxes = [t.box * self._scale for t in self.tracks]
+		per_box = [self._box_points(self._prev_gray, b) for b in boxes]
+		p0 = np.concatenate(per_box).reshape(-1, 1, 2)
+		p1, st1, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, p0, None, winSize=(15, 15), maxLevel=2)
+		back, st2, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev_gray, p1, None, winSize=(15, 15), maxLevel=2)
+		fb = np.linalg.norm((back - p0).reshape(-1, 2), axis=1)
+		ok = (st1.ravel() == 1) & (st2.ravel() == 1) & (fb < self.fb_error)
+		shift = (p1 - p0).reshape(-1, 2)
+		start = 0
+		for track, pts in zip(self.tracks, per_box):
+			sl = slice(start, start + len(pts))
+			start += len(pts)
+			good = ok[sl]
+			if good.sum() < 2:
+				track.confidence = 0.0
+				continue
+			dx, dy = np.median(shift[sl][good], axis=0) / self._scale
+			track.box = track.box + np.array([dx, dy, dx, dy], dtype=np.float32)
+			track.confidence *= float(good.mean())
+			track.age += 1
+
+	def _associate(self, detections: Sequence) -> None:
+		"""Replace tracks by keyframe detections, carrying the age of IoU-matched tracks."""
+		boxes = np.array([[d.x1, d.y1, d.x2, d.y2] for d in detections], dtype=np.float32).reshape(-1, 4)
+		old = np.array([t.box for t in self.tracks], dtype=np.float32).reshape(-1, 4)
+		ious = iou_matrix(boxes, old)
+		new_tracks: List[Track] = []
+		used = set()
+		for i, det in enumerate(detections):
+			age = 0
+			if ious.shape[1]:
+				for j in np.argsort(-ious[i]):
+					if ious[i, j] < self.iou_th:
+						break
+					if j not in used and self.tracks[j].cls_name == det.cls_name:
+						used.add(j)
+						age = self.tracks[j].age + 1
+						break
+			new_tracks.append(Track(boxes[i].copy(), float(det.score), det.cls_name, 1.0, age))
+		self.tracks = new_tracks
+
+	def _needs_redetect(self) -> bool:
+		return any(t.confidence < self.min_confidence for t in self.tracks)
+
+	def track(self, frames: List[np.ndarray], detect: Callable[[List[np.ndarray]], List[list]]) -> List[List[Track]]:
+		"""
+		Return the tracked boxes of every frame, calling detect() (batched) on
+		the planned keyframes and again on single frames whose tracks degraded.
+		Tracks expose center and cls_name like detections.
+		"""
+		if not frames:
+			return []
+		planned = []
+		since = self._since_key
+		for i in range(len(frames)):
+			if (i == 0 and self._prev_gray is None) or since + 1 >= self.keyframe_interval:
+				planned.append(i)
+				since = 0
+			else:
+				since += 1
+		detected = dict(zip(planned, detect([frames[i] for i in planned]) if planned else []))
+		self.keyframes += len(planned)
+
+		out: List[list] = []
+		for i, frame in enumerate(frames):
+			gray = self._gray(frame)
+			if i not in detected:
+				self._propagate(gray)
+				self._since_key += 1
+				if self._needs_redetect():
+					detected[i] = detect([frame])[0]
+					self.redetects += 1
+			if i in detected:
+				self._associate(detected[i])
+				self._since_key = 0
+			self._prev_gray = gray
+			# Snapshot: propagation replaces boxes of the live tracks
+			out.append([replace(t) for t in self.tracks])
+		return out
+
+
+def tracking_enabled() -> bool:
+	return os.getenv("TRACKING", "0") not in ("0", "false", "False", "")
+
+
+def make_tracker() -> BoxTracker:
+	try:
+		interval = int(os.getenv("TRACK_KEYFRAME_INTERVAL", "4"))
+	except Exception:
+		interval = 4
+	try:
+		min_confidence = float(os.getenv("TRACK_MIN_CONFIDENCE", "0.5"))
+	except Exception:
+		min_confidence = 0.5
+	return BoxTracker(keyframe_interval=interval, min_confidence=min_confidence)
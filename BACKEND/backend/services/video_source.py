@@ -0,0 +1,415 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from .pipeline_stats import pipeline_stats
+
+
+logger = logging.getLogger("video_source")
+
+
+@dataclass
+class VideoState:
+	cap: Any
+	total_frames: int
+	fps: float
+	next_frame_idx: int
+	stream_path: str
+
+
+def open_video_state(stream_path: str) -> VideoState:
+	cap = cv2.VideoCapture(stream_path)
+	if not cap.isOpened():
+		return VideoState(cap=cap, total_frames=0, fps=30.0, next_frame_idx=0, stream_path=stream_path)
+
+	fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+	if fps is None or fps <= 0.0 or fps != fps:  # check NaN
+		fps = 30.0  # default
+	total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+	if total_frames < 0:
+		total_frames = 0
+	return VideoState(cap=cap, total_frames=total_frames, fps=float(fps), next_frame_idx=0, stream_path=stream_path)
+
+
+# Queue item: (window id, frame); a None frame marks the end of the stream
+_Item = Tuple[int, Optional[np.ndarray]]
+
+
+class VideoSource:
+	"""
+	Per-floor decoder thread that keeps a bounded queue of frames ahead of the
+	refresh job, so decoding overlaps with inference.
+
+	Each refresh consumes one window: `window` frames (fps by default) spread
+	evenly over the next `step` frames (REFRESH_INTERVAL_SECONDS of video).
+	The decoder walks the stream with grab() and only retrieve()s (converts)
+	the sampled frames, so files are never seeked except when wrapping at the
+	end. The decoder blocks while the queue is full. Live streams (no frame
+	count) are grabbed continuously and the oldest queued frame is dropped when
+	the queue is full, so a refresh always sees recent frames.
+	"""
+
+	def __init__(
+		self,
+		floor_id: str,
+		stream_path: str,
+		queue_size: int = 16,
+		window: int | None = None,
+		step: int | None = None,
+		read_timeout: float = 10.0,
+		sample_rate: float | None = None,
+	) -> None:
+		self.floor_id = floor_id
+		self.stream_path = stream_path
+		self.opened_at = time.monotonic()
+		self.state = open_video_state(stream_path)
+		cap = self.state.cap
+		self.source_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH) or 0), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT) or 0))
+		# Size of the frames handed to the consumer; backends may decode smaller
+		self.frame_size = self.source_size
+		self.fps = self.state.fps
+		self.total_frames = self.state.total_frames
+		self.is_live = self.total_frames <= 0
+		self.read_timeout = read_timeout
+		self.sample_rate = sample_rate
+
+		if sample_rate:
+			# Fixed sampling rate: windows of about one second of samples
+			window = max(1, int(round(sample_rate)))
+			step = int(round(self.fps * window / sample_rate))
+		# Determine how many frames to sample per refresh: default 30 per second
+		self.window = window or int(round(self.fps)) or 30
+		if step is None:
+			try:
+				interval_seconds = int(os.getenv("REFRESH_INTERVAL_SECONDS", "5"))
+			except Exception:
+				interval_seconds = 5
+			# Advance by wall-clock interval instead of contiguous frames
+			step = int(round(self.fps * max(0, interval_seconds)))
+		# Windows never overlap: the cursor only moves forward between seeks
+		self.step = max(step or 0, self.window)
+
+		self._queue: "queue.Queue[_Item]" = queue.Queue(maxsize=max(1, int(queue_size)))
+		self._window_id = 0
+		self._pending: _Item | None = None
+		self.ended = False
+		self._stop = threading.Event()
+		self._thread: threading.Thread | None = None
+		if cap.isOpened():
+			self._setup()
+			self._thread = threading.Thread(target=self._run, name=f"video-source-{floor_id}", daemon=True)
+			self._thread.start()
+
+	def _setup(self) -> None:
+		"""Hook for backends to prepare before the decoder thread starts."""
+
+	def is_opened(self) -> bool:
+		return self._thread is not None
+
+	@property
+	def scale(self) -> Tuple[float, float]:
+		"""(sx, sy) mapping stream coordinates to coordinates of the frames handed out."""
+		if not self.source_size[0] or not self.source_size[1]:
+			return 1.0, 1.0
+		return self.frame_size[0] / self.source_size[0], self.frame_size[1] / self.source_size[1]
+
+	def read(self, max_frames: int) -> List[np.ndarray]:
+		"""
+		Return up to max_frames frames of the current window, blocking while the
+		decoder catches up. Returns fewer (possibly none) at the end of the window
+		or once the stream can no longer be read.
+		"""
+		frames: List[np.ndarray] = []
+		if not self.is_opened():
+			return frames
+		pipeline_stats.set(self.floor_id, "decode_queue_depth", self._queue.qsize())
+		waited = 0.0
+		while len(frames) < max_frames and not self.ended:
+			item, self._pending = self._pending, None
+			if item is None:
+				start = time.perf_counter()
+				try:
+					item = self._queue.get(timeout=self.read_timeout)
+				except queue.Empty:
+					break
+				finally:
+					waited += time.perf_counter() - start
+			window_id, frame = item
+			if frame is None:
+				self.ended = True
+				break
+			if not self.is_live:
+				if window_id < self._window_id:
+					# Unread tail of a window the consumer already finished
+					continue
+				if window_id > self._window_id:
+					self._pending = item
+					break
+			frames.append(frame)
+		pipeline_stats.incr(self.floor_id, "decode_wait_ms", waited * 1000.0)
+		return frames
+
+	def finish_window(self) -> None:
+		"""Move on to the next window; frames of the current one still queued are discarded."""
+		self._window_id += 1
+
+	def close(self) -> None:
+		self._stop.set()
+		# Unblock a decoder waiting on a full queue
+		while True:
+			try:
+				self._queue.get_nowait()
+			except queue.Empty:
+				break
+		if self._thread is not None:
+			self._thread.join(timeout=5.0)
+
+	def _put(self, item: _Item) -> bool:
+		"""Blocking put that gives up when the source is closed."""
+		while not self._stop.is_set():
+			try:
+				self._queue.put(item, timeout=0.5)
+				return True
+			except queue.Full:
+				continue
+		return False
+
+	def _put_latest(self, item: _Item) -> None:
+		"""Non-blocking put that drops the oldest queued frame when full."""
+		while True:
+			try:
+				self._queue.put_nowait(item)
+				return
+			except queue.Full:
+				try:
+					self._queue.get_nowait()
+					pipeline_stats.incr(self.floor_id, "decode_dropped")
+				except queue.Empty:
+					pass
+
+	def _run(self) -> None:
+		try:
+			if self.is_live:
+				self._run_live()
+			else:
+				self._run_file()
+		except Exception as e:
+			logger.exception("Decoder for floor %s failed: %s", self.floor_id, e)
+			self._put_latest((self._window_id, None))
+		finally:
+			self.state.cap.release()
+
+	def _grab(self) -> bool:
+		if not self.state.cap.grab():
+			return False
+		pipeline_stats.incr(self.floor_id, "decode_grabbed")
+		return True
+
+	def _retrieve(self) -> Optional[np.ndarray]:
+		ret, frame = self.state.cap.retrieve()
+		if not ret:
+			return None
+		pipeline_stats.incr(self.floor_id, "decode_frames")
+		return frame
+
+	def _run_file(self) -> None:
+		state = self.state
+		cap = state.cap
+		window_id = 0
+		while not self._stop.is_set():
+			window, step = self.window, self.step
+			sample = 0
+			for offset in range(step):
+				if self._stop.is_set():
+					return
+				if not self._grab():
+					# Wrap around to the start of the file
+					state.next_frame_idx = 0
+					cap.set(cv2.CAP_PROP_POS_FRAMES, state.next_frame_idx)
+					if not self._grab():
+						self._put((window_id, None))
+						return
+				state.next_frame_idx += 1
+				# Sample offsets k * step // window for k in range(window)
+				if sample < window and offset == sample * step // window:
+					sample += 1
+					frame = self._retrieve()
+					if frame is not None and not self._put((window_id, frame)):
+						return
+			window_id += 1
+
+	def _run_live(self) -> None:
+		stride = max(1, self.step // self.window)
+		grabbed = 0
+		while not self._stop.is_set():
+			if not self._grab():
+				self._put_latest((0, None))
+				return
+			grabbed += 1
+			if (grabbed - 1) % stride:
+				continue
+			frame = self._retrieve()
+			if frame is not None:
+				self._put_latest((0, frame))
+
+
+class FfmpegVideoSource(VideoSource):
+	"""
+	VideoSource that decodes through a local ffmpeg subprocess.
+
+	ffmpeg applies the sampling (fps filter at window samples per step frames)
+	and downscales to at most decode_size pixels on the long side, so Python
+	only receives the frames it infers on, already near inference resolution.
+	Raw BGR frames are read from the pipe straight into freshly allocated
+	NumPy arrays; buffers are not pooled because crops and slices of a frame
+	may outlive it.
+	Files are looped by ffmpeg (-stream_loop -1) instead of seeking.
+	"""
+
+	def __init__(self, floor_id: str, stream_path: str, ffmpeg: str = "ffmpeg", decode_size: int = 640, **kwargs: Any) -> None:
+		self.ffmpeg = ffmpeg
+		self.decode_size = decode_size
+		self._proc: subprocess.Popen | None = None
+		super().__init__(floor_id, stream_path, **kwargs)
+
+	def _setup(self) -> None:
+		width, height = self.source_size
+		r = min(1.0, self.decode_size / float(max(width, height, 1)))
+		# rawvideo bgr24 frames keep even dimensions for the scaler
+		self.frame_size = (max(2, int(round(width * r / 2)) * 2), max(2, int(round(height * r / 2)) * 2))
+		# The OpenCV handle was only needed to probe the stream
+		self.state.cap.release()
+
+	def _command(self) -> List[str]:
+		rate = Fraction(self.fps).limit_denominator(1001) * self.window / self.step
+		width, height = self.frame_size
+		cmd = [self.ffmpeg, "-nostdin", "-loglevel", "error"]
+		if not self.is_live:
+			cmd += ["-stream_loop", "-1"]
+		cmd += [
+			"-i", self.stream_path,
+			"-an",
+			"-vf", f"fps={rate.numerator}/{rate.denominator},scale={width}:{height}:flags=area",
+			"-f", "rawvideo",
+			"-pix_fmt", "bgr24",
+			"pipe:1",
+		]
+		return cmd
+
+	def _read_into(self, frame: np.ndarray) -> bool:
+		view = memoryview(frame).cast("B")
+		got = 0
+		while got < len(view):
+			n = self._proc.stdout.readinto(view[got:])
+			if not n:
+				return False
+			got += n
+		return True
+
+	def _run_pipe(self, put: Callable[[int, np.ndarray], bool]) -> None:
+		self._proc = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+		try:
+			produced = 0
+			while not self._stop.is_set():
+				frame = np.empty((self.frame_size[1], self.frame_size[0], 3), dtype=np.uint8)
+				if not self._read_into(frame):
+					put(produced // self.window, None)
+					return
+				pipeline_stats.incr(self.floor_id, "decode_frames")
+				if not put(produced // self.window, frame):
+					return
+				produced += 1
+		finally:
+			self._proc.kill()
+			self._proc.wait()
+
+	def _run_file(self) -> None:
+		self._run_pipe(lambda window_id, frame: self._put((window_id, frame)))
+
+	def _run_live(self) -> None:
+		def put(window_id: int, frame: Optional[np.ndarray]) -> bool:
+			self._put_latest((0, frame))
+			return True
+		self._run_pipe(put)
+
+	def close(self) -> None:
+		self._stop.set()
+		# Unblock a decoder waiting on the pipe
+		if self._proc is not None and self._proc.poll() is None:
+			self._proc.kill()
+		super().close()
+
+
+def _source_factory() -> Callable[..., VideoSource]:
+	"""VideoSource class for VIDEO_BACKEND, falling back to OpenCV when ffmpeg is unavailable."""
+	backend = os.getenv("VIDEO_BACKEND", "opencv").strip().lower()
+	if backend == "ffmpeg":
+		binary = shutil.which(os.getenv("FFMPEG_BINARY", "ffmpeg"))
+		if binary:
+			try:
+				decode_size = max(32, int(os.getenv("VIDEO_DECODE_SIZE", "640")))
+			except Exception:
+				decode_size = 640
+			return lambda *args, **kwargs: FfmpegVideoSource(*args, ffmpeg=binary, decode_size=decode_size, **kwargs)
+		logger.warning("VIDEO_BACKEND=ffmpeg but no ffmpeg binary was found; using OpenCV")
+	return VideoSource
+
+
+_sources: Dict[str, VideoSource] = {}
+_sources_lock = threading.Lock()
+
+
+def get_video_source(floor_id: str, stream_path: str, sample_rate: float | None = None) -> VideoSource:
+	"""
+	Per-floor source, reopened when the stream path or sample_rate (samples per
+	second of video, None for one window per refresh) changes, a previously
+	readable stream ended, or the stream failed to open. Failed streams (e.g. a
+	camera that is down) are retried at most every VIDEO_REOPEN_SECONDS.
+	"""
+	with _sources_lock:
+		source = _sources.get(floor_id)
+		if source is not None and source.stream_path == stream_path and source.sample_rate == sample_rate and not source.ended:
+			if source.is_opened():
+				return source
+			try:
+				retry = float(os.getenv("VIDEO_REOPEN_SECONDS", "5"))
+			except Exception:
+				retry = 5.0
+			if time.monotonic() - source.opened_at < retry:
+				return source
+		if source is not None:
+			source.close()
+		try:
+			queue_size = max(1, int(os.getenv("VIDEO_PREFETCH_FRAMES", "16")))
+		except Exception:
+			queue_size = 16
+		source = _source_factory()(floor_id, stream_path, queue_size=queue_size, sample_rate=sample_rate)
+		_sources[floor_id] = source
+		return source
+
+
+def close_video_source(floor_id: str) -> None:
+	with _sources_lock:
+		source = _sources.pop(floor_id, None)
+	if source is not None:
+		source.close()
+
+
+def close_video_sources() -> None:
+	with _sources_lock:
+		sources = list(_sources.values())
+		_sources.clear()
+	for source in sources:
+		source.close()
@@ -1,10 +1,12 @@
 from __future__ import annotations
 
+import logging
+import threading
 import time
 from dataclasses import dataclass
 import os
 from pathlib import Path
-from typing import Dict, List, Tuple, Any
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 import cv2
 import numpy as np
@@ -12,18 +14,39 @@ import torch
 from sqlalchemy.orm import Session
 
 from ..models import Seat, Report, User
+from .cascade import Cascade, fast_weights_path, get_cascade
+from .frame_budget import get_frame_budget
+from .inference_backend import InferenceBackend, load_backend
+from .inference_queue import get_inference_queue
+from .motion_gate import get_motion_gate, motion_gate_enabled
+from .pipeline_stats import pipeline_stats
+from .roi_index import get_label_map
+from .seat_change import get_seat_change_detector, seat_change_enabled
+from .seat_classifier import get_seat_classifier, get_seat_warper
+from .sequential_stop import get_sequential_stop
+from .tracker import BoxTracker, make_tracker, tracking_enabled
+from .roi_loader import CompiledFloorConfig, compile_floor_config
 from .rollover import perform_rollovers_if_needed
+from .video_source import get_video_source
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 YOLO_DIR = BASE_DIR / "yolov11"
 from .yolo_util import util  # type: ignore
 
+logger = logging.getLogger("yolo_service")
 
+
+PERSON_NAME = "person"
 OBJECT_NAMES_DEFAULT = {
 	"backpack", "handbag", "suitcase", "book", "laptop", "cell phone",
 	"mouse", "keyboard", "bottle", "cup", "umbrella","scissors"
 }
 
+# Fraction of sampled frames with a hit needed to call a person/object present
+PRESENCE_RATIO = 0.3
+# Object-only occupancy (no person) lasting this long marks a seat malicious
+MALICIOUS_SECONDS = 7200
+
 
 @dataclass
 class Detection:
@@ -39,135 +62,203 @@ class Detection:
 		return (self.x1 + self.x2) / 2.0, (self.y1 + self.y2) / 2.0
 
 
-@dataclass
-class VideoState:
-	cap: Any
-	total_frames: int
-	fps: float
-	next_frame_idx: int
-	stream_path: str
-
-
-_video_states: Dict[str, VideoState] = {}
-
-
-def _open_or_get_video_state(floor_id: str, stream_path: str) -> VideoState:
-	state = _video_states.get(floor_id)
-	if state and state.stream_path == stream_path and state.cap.isOpened():
-		return state
-
-	cap = cv2.VideoCapture(stream_path)
-	if not cap.isOpened():
-		# create a dummy state to avoid reopening loop
-		state = VideoState(cap=cap, total_frames=0, fps=30.0, next_frame_idx=0, stream_path=stream_path)
-		_video_states[floor_id] = state
-		return state
-
-	fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
-	if fps is None or fps <= 0.0 or fps != fps:  # check NaN
-		fps = 30.0  # default
-	total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
-	if total_frames < 0:
-		total_frames = 0
-	state = VideoState(cap=cap, total_frames=total_frames, fps=float(fps), next_frame_idx=0, stream_path=stream_path)
-	_video_states[floor_id] = state
-	return state
+def _resolve_class_names(value: Iterable[str] | str | None) -> Iterable[str] | None:
+	"""
+	Classes the detector keeps. None reads INFERENCE_CLASSES; "library" (default)
+	keeps person plus OBJECT_NAMES_DEFAULT, "all" keeps every class, any other
+	string is a comma-separated list of class names.
+	"""
+	if value is None:
+		value = os.getenv("INFERENCE_CLASSES", "library")
+	if not isinstance(value, str):
+		return value
+	value = value.strip()
+	if value == "all":
+		return None
+	if value == "library":
+		return {PERSON_NAME, *OBJECT_NAMES_DEFAULT}
+	return [v.strip() for v in value.split(",") if v.strip()]
 
 
 class YOLODetector:
-	def __init__(self) -> None:
+	def __init__(
+		self,
+		rect: bool | None = None,
+		class_names: Iterable[str] | str | None = None,
+		weights: str | Path | None = None,
+		backend: str | None = None,
+	) -> None:
 		# Ensure yolov11 directory is in Python path for nets module import
 		import sys
 		if str(YOLO_DIR) not in sys.path:
 			sys.path.insert(0, str(YOLO_DIR))
 		
 		self.device = "cuda:0" if torch.cuda.is_available() else "cpu"
-		weights_path = YOLO_DIR / "weights" / "yolo11x.pt"
-		ckpt = torch.load(weights_path.as_posix(), map_location=self.device, weights_only=False)
-		self.model = ckpt["model"].float().to(self.device)
-		if self.device.startswith("cuda"):
-			self.model.half()
-		self.model.eval()
-		# Load names from args.yaml
-		import yaml
-		with (YOLO_DIR / "utils" / "args.yaml").open("r", encoding="utf-8") as f:
-			params = yaml.safe_load(f)
-		self.names = params.get("names", {})
-		self.person_name = "person"
+		# All forwards go through one inference thread; cap intra-op threads if requested
+		torch_threads = os.getenv("INFERENCE_TORCH_THREADS")
+		if torch_threads:
+			torch.set_num_threads(max(1, int(torch_threads)))
+		weights_path = Path(weights) if weights is not None else YOLO_DIR / "weights" / "yolo11x.pt"
+		# INFERENCE_BACKEND picks eager torch or onnxruntime (which runs on the CPU)
+		self.backend: InferenceBackend = load_backend(weights_path, self.device, backend)
+		self.device = self.backend.device
+		# Names stored with the model (class-pruned checkpoints) win over the COCO names in args.yaml
+		self.names = self.backend.names
+		if self.names is None:
+			import yaml
+			with (YOLO_DIR / "utils" / "args.yaml").open("r", encoding="utf-8") as f:
+				params = yaml.safe_load(f)
+			self.names = params.get("names", {})
+		# Class whitelist applied inside NMS (None keeps all classes)
+		class_names = _resolve_class_names(class_names)
+		self.classes: List[int] | None = None
+		if class_names is not None:
+			wanted = set(class_names)
+			known = set(self.names.values())
+			unknown = sorted(wanted - known)
+			if unknown:
+				logger.warning("Classes not in %s: %s", weights_path.name, ", ".join(unknown))
+			if not wanted & known:
+				raise ValueError(f"None of the requested classes ({', '.join(sorted(wanted))}) exist in {weights_path.name}")
+			self.classes = sorted(int(i) for i, name in self.names.items() if name in wanted)
+		self.person_name = PERSON_NAME
 		self.object_names = OBJECT_NAMES_DEFAULT
-
-	@torch.no_grad()
-	def detect_frame(self, frame: np.ndarray, conf_th: float = 0.15, iou_th: float = 0.2) -> List[Detection]:
+		self.inp_size = 640
+		# Rectangular mode pads only up to the next stride multiple instead of a square
+		if rect is None:
+			rect = os.getenv("INFERENCE_RECT", "0") not in ("0", "false", "False", "")
+		self.rect = rect
+		self.stride = self.backend.stride
+		self.backend.warmup((self.inp_size, self.inp_size))
+		# Preallocated NCHW uint8 input batch, grown on demand and guarded by _lock
+		self._input_buf: np.ndarray | None = None
+		self._lock = threading.Lock()
+
+	def _letterbox_into(self, frame: np.ndarray, out: np.ndarray) -> Tuple[float, float, float]:
+		"""
+		Letterbox one BGR frame into a preallocated (3, H, W) RGB slot.
+		Returns (gain, pad_w, pad_h) needed to map boxes back to frame coordinates.
+		"""
+		inp_size = self.inp_size
+		inp_h, inp_w = out.shape[1:]
 		shape = frame.shape[:2]  # (h, w)
-		image = frame.copy()
+		image = frame
 
-		# Resize short edge to <= inp_size (letterbox)
-		inp_size = 640
+		# Resize long edge to inp_size
 		r = inp_size / max(shape[0], shape[1])
 		if r != 1:
 			resample = cv2.INTER_LINEAR if r > 1 else cv2.INTER_AREA
 			image = cv2.resize(image, dsize=(int(shape[1] * r), int(shape[0] * r)), interpolation=resample)
 		height, width = image.shape[:2]
 
-		# Scale ratio (new / old)
-		r = min(1.0, inp_size / height, inp_size / width)
-
 		# Compute padding
-		pad = int(round(width * r)), int(round(height * r))
-		w = (inp_size - pad[0]) / 2
-		h = (inp_size - pad[1]) / 2
-
-		if (width, height) != pad:  # resize
-			image = cv2.resize(image, pad, interpolation=cv2.INTER_LINEAR)
-		top, bottom = int(round(h - 0.1)), int(round(h + 0.1))
-		left, right = int(round(w - 0.1)), int(round(w + 0.1))
-		image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT)
-
-		# To tensor
-		x = image.transpose((2, 0, 1))[::-1]
-		x = np.ascontiguousarray(x)
-		x = torch.from_numpy(x).unsqueeze(0).to(self.device)
-		if self.device.startswith("cuda"):
-			x = x.half()
-		else:
-			x = x.float()
-		x = x / 255
-
-		# Inference + NMS
-		outputs = self.model(x)
-		outputs = util.non_max_suppression(outputs, conf_th, iou_th)[0]
-
-		dets: List[Detection] = []
-		if outputs is None or len(outputs) == 0:
-			return dets
-
-		# Undo padding and scaling to original shape
-		outputs[:, [0, 2]] -= w
-		outputs[:, [1, 3]] -= h
-		outputs[:, :4] /= min(height / shape[0], width / shape[1])
-		outputs[:, 0].clamp_(0, shape[1])
-		outputs[:, 1].clamp_(0, shape[0])
-		outputs[:, 2].clamp_(0, shape[1])
-		outputs[:, 3].clamp_(0, shape[0])
-
-		for box in outputs:
-			x1, y1, x2, y2, score, index = box.tolist()
-			idx = int(index)
-			cls_name = self.names.get(idx, str(idx))
-			dets.append(Detection(x1, y1, x2, y2, float(score), cls_name))
-		return dets
+		w = (inp_w - width) / 2
+		h = (inp_h - height) / 2
+		top = int(round(h - 0.1))
+		left = int(round(w - 0.1))
+
+		# Pad with zeros, HWC -> CHW, BGR -> RGB
+		out.fill(0)
+		out[:, top:top + height, left:left + width] = image.transpose((2, 0, 1))[::-1]
+		return min(height / shape[0], width / shape[1]), w, h
+
+	def input_shape(self, frames: List[np.ndarray]) -> Tuple[int, int]:
+		"""
+		Network input (H, W) for a batch: inp_size square, or in rect mode the
+		largest resized frame rounded up to a multiple of the model stride.
+		"""
+		if not self.rect:
+			return self.inp_size, self.inp_size
+		inp_h = inp_w = 0
+		for frame in frames:
+			h, w = frame.shape[:2]
+			r = self.inp_size / max(h, w)
+			inp_h = max(inp_h, int(h * r))
+			inp_w = max(inp_w, int(w * r))
+		s = self.stride
+		return (inp_h + s - 1) // s * s, (inp_w + s - 1) // s * s
+
+	def _input_buffer(self, n: int, shape: Tuple[int, int]) -> np.ndarray:
+		buf = self._input_buf
+		if buf is None or buf.shape[0] < n or buf.shape[2:] != shape:
+			buf = np.zeros((max(n, buf.shape[0] if buf is not None else 0), 3, shape[0], shape[1]), dtype=np.uint8)
+			self._input_buf = buf
+		return buf[:n]
+
+	@torch.no_grad()
+	def detect_frames(self, frames: List[np.ndarray], conf_th: float = 0.15, iou_th: float = 0.2) -> List[List[Detection]]:
+		"""
+		Letterbox all frames into one NCHW batch, run a single forward pass and
+		batched NMS. Returns one detection list per input frame.
+		"""
+		if not frames:
+			return []
+		with self._lock:
+			batch = self._input_buffer(len(frames), self.input_shape(frames))
+			letterbox = [self._letterbox_into(frame, batch[i]) for i, frame in enumerate(frames)]
+
+			# To tensor
+			x = torch.from_numpy(batch).to(self.device)
+			if self.backend.half:
+				x = x.half()
+			else:
+				x = x.float()
+			x = x / 255
+
+			# Inference + NMS
+			outputs = self.backend.infer(x)
+			outputs = util.non_max_suppression(outputs, conf_th, iou_th, classes=self.classes)
+
+		results: List[List[Detection]] = []
+		for frame, (gain, w, h), output in zip(frames, letterbox, outputs):
+			dets: List[Detection] = []
+			results.append(dets)
+			if output is None or len(output) == 0:
+				continue
+
+			# Undo padding and scaling to original shape
+			shape = frame.shape[:2]
+			output[:, [0, 2]] -= w
+			output[:, [1, 3]] -= h
+			output[:, :4] /= gain
+			output[:, 0].clamp_(0, shape[1])
+			output[:, 1].clamp_(0, shape[0])
+			output[:, 2].clamp_(0, shape[1])
+			output[:, 3].clamp_(0, shape[0])
+
+			for box in output.tolist():
+				x1, y1, x2, y2, score, index = box
+				idx = int(index)
+				cls_name = self.names.get(idx, str(idx))
+				dets.append(Detection(x1, y1, x2, y2, float(score), cls_name))
+		return results
+
+	def detect_frame(self, frame: np.ndarray, conf_th: float = 0.15, iou_th: float = 0.2) -> List[Detection]:
+		return self.detect_frames([frame], conf_th, iou_th)[0]
 
 
 _detector: YOLODetector | None = None
+_fast_detector: YOLODetector | None = None
+_detector_lock = threading.Lock()
 
 
 def get_detector() -> YOLODetector:
 	global _detector
-	if _detector is None:
-		_detector = YOLODetector()
+	with _detector_lock:
+		if _detector is None:
+			_detector = YOLODetector()
 	return _detector
 
 
+def get_fast_detector() -> YOLODetector:
+	"""First-stage detector of the cascade (see INFERENCE_CASCADE)."""
+	global _fast_detector
+	with _detector_lock:
+		if _fast_detector is None:
+			_fast_detector = YOLODetector(weights=fast_weights_path())
+	return _fast_detector
+
+
 def point_in_polygon(pt: Tuple[float, float], poly: List[List[float]]) -> bool:
 	"""
 	Ray casting algorithm for point-in-polygon
@@ -184,34 +275,158 @@ def point_in_polygon(pt: Tuple[float, float], poly: List[List[float]]) -> bool:
 	return inside
 
 
-def refresh_floor(db: Session, floor_cfg: Dict[str, Any], sample_frames: int = 16) -> List[Seat]:
-	"""
-	Run YOLO on a short clip from stream_path, update DB seats for this floor,
-	and return updated Seat rows.
-	"""
-	# Offline rollover handling
-	now_ts = int(time.time())
+def _roi_crop_box(cfg: CompiledFloorConfig, frame_size: Tuple[int, int]) -> Tuple[int, int, int, int] | None:
+	"""Padded union box of the seat ROIs when ROI_CROP is enabled, else None."""
+	if os.getenv("ROI_CROP", "0") in ("0", "false", "False", ""):
+		return None
 	try:
-		perform_rollovers_if_needed(db, now_ts)
+		pad = max(0, int(os.getenv("ROI_CROP_PAD", "128")))
 	except Exception:
-		# best-effort; don't block detection
-		pass
-	floor_id = floor_cfg["floor_id"]
-	# Normalize stream path to absolute (relative to project root)
-	_stream = Path(str(floor_cfg["stream_path"]))
-	if not _stream.is_absolute():
-		_stream = (BASE_DIR / _stream)
-	stream_path = _stream.as_posix()
-	seats_cfg = floor_cfg["seats"]
-
-	# Ensure all seats exist in DB
-	existing = {s.seat_id: s for s in db.query(Seat).filter(Seat.floor_id == floor_id).all()}
-	for s in seats_cfg:
-		if s["seat_id"] not in existing:
+		pad = 128
+	return cfg.crop_box(frame_size, pad)
+
+
+def _detect_seat_region(cfg: CompiledFloorConfig, frames: List[np.ndarray], inference) -> List[List[Detection]]:
+	"""
+	Detect on the seat-bearing region of each frame (see ROI_CROP) and return
+	detections in full-frame coordinates.
+	"""
+	if not frames:
+		return []
+	box = _roi_crop_box(cfg, (frames[0].shape[1], frames[0].shape[0]))
+	if box is None:
+		return inference.detect_frames(cfg.floor_id, frames)
+	x1, y1, x2, y2 = box
+	frame_dets = inference.detect_frames(cfg.floor_id, [f[y1:y2, x1:x2] for f in frames])
+	return [
+		[Detection(d.x1 + x1, d.y1 + y1, d.x2 + x1, d.y2 + y1, d.score, d.cls_name) for d in dets]
+		for dets in frame_dets
+	]
+
+
+def _cascade_detect(
+	cfg: CompiledFloorConfig,
+	frames: List[np.ndarray],
+	inference,
+	label_map,
+	cascade: Cascade,
+) -> List[List[Detection]]:
+	"""
+	Detect with the fast model, then re-detect the frames the cascade flags
+	as ambiguous with the full model.
+	"""
+	if not frames:
+		return []
+	floor_id = cfg.floor_id
+	started = time.perf_counter()
+	frame_dets = _detect_seat_region(cfg, frames, get_inference_queue("fast"))
+	fast_ms = (time.perf_counter() - started) * 1000.0
+	escalate = np.flatnonzero(cascade.escalate(frame_dets, label_map, PERSON_NAME, OBJECT_NAMES_DEFAULT))
+	if len(escalate):
+		started = time.perf_counter()
+		full = _detect_seat_region(cfg, [frames[i] for i in escalate], inference)
+		pipeline_stats.incr(floor_id, "cascade_full_ms", (time.perf_counter() - started) * 1000.0)
+		for i, dets in zip(escalate, full):
+			frame_dets[i] = dets
+	pipeline_stats.incr(floor_id, "cascade_frames", len(frames))
+	pipeline_stats.incr(floor_id, "cascade_escalated", len(escalate))
+	pipeline_stats.incr(floor_id, "cascade_fast_ms", fast_ms)
+
+	total = pipeline_stats.get(floor_id, "cascade_frames")
+	escalated = pipeline_stats.get(floor_id, "cascade_escalated")
+	pipeline_stats.set(floor_id, "cascade_escalation_rate", escalated / total)
+	pipeline_stats.set(floor_id, "cascade_fast_ms_per_frame", pipeline_stats.get(floor_id, "cascade_fast_ms") / total)
+	if escalated:
+		pipeline_stats.set(floor_id, "cascade_full_ms_per_frame", pipeline_stats.get(floor_id, "cascade_full_ms") / escalated)
+	return frame_dets
+
+
+def _infer_seat_hits(
+	cfg: CompiledFloorConfig,
+	frames: List[np.ndarray],
+	inference,
+	label_map,
+	gate_on: bool,
+	tracker: BoxTracker | None = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+	"""
+	Run frames through the motion gate (or the keyframe tracker) and YOLO and
+	return (frames, seats) person/object hit matrices.
+	"""
+	floor_id = cfg.floor_id
+	frame_size = (frames[0].shape[1], frames[0].shape[0])
+	# OCCUPANCY_ENGINE=classifier answers per seat from warped desk crops instead of detections
+	classifier = get_seat_classifier()
+	if classifier is not None:
+		pipeline_stats.incr(floor_id, "classifier_frames", len(frames))
+		return classifier.seat_hits(get_seat_warper(cfg, frame_size, classifier.size), frames)
+	# With INFERENCE_CASCADE every frame that needs detection goes through the fast model first
+	cascade = get_cascade(PRESENCE_RATIO)
+	if cascade is not None:
+		detect = lambda fs: _cascade_detect(cfg, fs, inference, label_map, cascade)
+	else:
+		detect = lambda fs: _detect_seat_region(cfg, fs, inference)
+	if tracker is not None:
+		# Detect on keyframes only and follow boxes with optical flow in between
+		keyframes, redetects = tracker.keyframes, tracker.redetects
+		frame_dets = tracker.track(frames, detect)
+		pipeline_stats.incr(floor_id, "track_frames", len(frames))
+		pipeline_stats.incr(floor_id, "track_keyframes", tracker.keyframes - keyframes)
+		pipeline_stats.incr(floor_id, "track_redetects", tracker.redetects - redetects)
+	elif gate_on:
+		# Reuse detections of the last inferred frame when seat ROIs didn't change
+		gate = get_motion_gate(cfg, frame_size)
+		infer_idx, source = gate.plan(frames)
+		inferred = detect([frames[i] for i in infer_idx])
+		frame_dets = gate.resolve(source, infer_idx, inferred)
+		pipeline_stats.incr(floor_id, "motion_frames", len(frames))
+		pipeline_stats.incr(floor_id, "motion_skipped", len(frames) - len(infer_idx))
+	else:
+		frame_dets = detect(frames)
+
+	person_hits = np.zeros((len(frames), cfg.num_seats), dtype=bool)
+	object_hits = np.zeros((len(frames), cfg.num_seats), dtype=bool)
+	for k, dets in enumerate(frame_dets):
+		person_pts = np.array([d.center for d in dets if d.cls_name == PERSON_NAME], dtype=np.float64)
+		object_pts = np.array([d.center for d in dets if d.cls_name in OBJECT_NAMES_DEFAULT], dtype=np.float64)
+		person_hits[k] = label_map.seat_hits(person_pts)
+		object_hits[k] = label_map.seat_hits(object_pts)
+	return person_hits, object_hits
+
+
+def _sampled_batches(source, window: int, batch_size: int, keep: set[int] | None) -> Iterator[List[np.ndarray]]:
+	"""
+	Yield batches of up to batch_size frames from one source window, keeping
+	only the window indices in keep (every frame when keep is None).
+	"""
+	read_frames = 0
+	batch: List[np.ndarray] = []
+	while read_frames < window:
+		frames = source.read(min(batch_size, window - read_frames))
+		if not frames:
+			break
+		for k, frame in enumerate(frames, read_frames):
+			if keep is None or k in keep:
+				batch.append(frame)
+		read_frames += len(frames)
+		if len(batch) >= batch_size:
+			yield batch[:batch_size]
+			batch = batch[batch_size:]
+	if batch:
+		yield batch
+
+
+def _ensure_seats(db: Session, cfg: CompiledFloorConfig) -> Dict[str, Seat]:
+	"""
+	Create missing Seat rows for a floor config and return the floor's seats by seat_id.
+	"""
+	existing = {s.seat_id: s for s in db.query(Seat).filter(Seat.floor_id == cfg.floor_id).all()}
+	for i, seat_id in enumerate(cfg.seat_ids):
+		if seat_id not in existing:
 			db.add(Seat(
-				seat_id=s["seat_id"],
-				floor_id=floor_id,
-				has_power=bool(s.get("has_power", 0)),
+				seat_id=seat_id,
+				floor_id=cfg.floor_id,
+				has_power=bool(cfg.has_power[i]),
 				is_empty=True,
 				is_reported=False,
 				is_malicious=False,
@@ -223,81 +438,18 @@ def refresh_floor(db: Session, floor_cfg: Dict[str, Any], sample_frames: int = 1
 				occupancy_start_ts=0,
 			))
 	db.commit()
-	existing = {s.seat_id: s for s in db.query(Seat).filter(Seat.floor_id == floor_id).all()}
-
-	# Initialize counters
-	counters: Dict[str, Dict[str, int]] = {s["seat_id"]: {"person": 0, "object": 0, "frames": 0} for s in seats_cfg}
-
-	# Persistent handle + sequential advance
-	vstate = _open_or_get_video_state(floor_id, stream_path)
-	cap = vstate.cap
-	if not cap.isOpened():
-		# If stream can't open, do nothing
-		return list(existing.values())
+	return {s.seat_id: s for s in db.query(Seat).filter(Seat.floor_id == cfg.floor_id).all()}
 
-	detector = get_detector()
-
-	# Determine how many frames to sample this refresh: default 30 per second
-	sample_frames = int(round(vstate.fps)) if vstate.fps > 0 else 30
-	if sample_frames <= 0:
-		sample_frames = 30
-
-	# Seek to next frame index (some backends may ignore seek; we still try)
-	if vstate.next_frame_idx > 0 and vstate.total_frames > 0:
-		cap.set(cv2.CAP_PROP_POS_FRAMES, vstate.next_frame_idx)
-
-	read_frames = 0
-	while read_frames < sample_frames:
-		ret, frame = cap.read()
-		if not ret:
-			# Attempt wrap-around if we know total frames
-			if vstate.total_frames > 0:
-				vstate.next_frame_idx = 0
-				cap.set(cv2.CAP_PROP_POS_FRAMES, vstate.next_frame_idx)
-				ret, frame = cap.read()
-				if not ret:
-					break
-			else:
-				break
-		read_frames += 1
-		dets = detector.detect_frame(frame)
-
-		# For quicker mapping, build per-category points list
-		person_pts = [d.center for d in dets if d.cls_name == detector.person_name]
-		object_pts = [d.center for d in dets if d.cls_name in detector.object_names]
-
-		for s in seats_cfg:
-			seat_id = s["seat_id"]
-			roi = s["desk_roi"]
-			hit_person = any(point_in_polygon(pt, roi) for pt in person_pts)
-			hit_object = any(point_in_polygon(pt, roi) for pt in object_pts)
-			if hit_person:
-				counters[seat_id]["person"] += 1
-			if hit_object:
-				counters[seat_id]["object"] += 1
-			counters[seat_id]["frames"] += 1
-
-	# Advance next frame index by wall-clock interval (e.g., 5s) instead of contiguous frames
-	try:
-		interval_seconds = int(os.getenv("REFRESH_INTERVAL_SECONDS", "5"))
-	except Exception:
-		interval_seconds = 5
-	step_frames = int(round(max(0.0, vstate.fps) * max(0, interval_seconds))) or read_frames
-	if vstate.total_frames > 0:
-		vstate.next_frame_idx = (vstate.next_frame_idx + step_frames) % vstate.total_frames
-	else:
-		vstate.next_frame_idx += step_frames
 
-	# Apply thresholds
-	now = now_ts
-	for s in seats_cfg:
-		seat = existing[s["seat_id"]]
-		stats = counters[seat.seat_id]
-		frames = max(1, stats["frames"])
-		person_ratio = stats["person"] / frames
-		object_ratio = stats["object"] / frames
-		person_present = person_ratio >= 0.3
-		object_present = object_ratio >= 0.3
+def _apply_seat_decisions(db: Session, seats: List[Seat], person_present: Iterable[bool], object_present: Iterable[bool], now: int) -> None:
+	"""
+	Apply one observed person/object presence decision per seat: empty-time
+	statistics, the object-only occupancy timer, malicious occupancy alerts and
+	the visual state (unless the seat is locked). The caller commits.
+	"""
+	for seat, person_flag, object_flag in zip(seats, person_present, object_present):
+		person_present = bool(person_flag)
+		object_present = bool(object_flag)
 		new_observed_is_empty = not (person_present or object_present)
 
 		# Update statistics regardless of lock
@@ -329,7 +481,7 @@ def refresh_floor(db: Session, floor_cfg: Dict[str, Any], sample_frames: int = 1
 
 		# 检测恶意占用（无论是否锁定，都要检测）
 		was_malicious = seat.is_malicious
-		if seat.occupancy_start_ts and (now - seat.occupancy_start_ts) >= 7200:
+		if seat.occupancy_start_ts and (now - seat.occupancy_start_ts) >= MALICIOUS_SECONDS:
 			seat.is_malicious = True
 			# 如果从非恶意变为恶意，自动创建系统警报报告
 			if not was_malicious and seat.is_malicious:
@@ -341,6 +493,147 @@ def refresh_floor(db: Session, floor_cfg: Dict[str, Any], sample_frames: int = 1
 
 		db.add(seat)
 
+
+def refresh_floor(db: Session, floor_cfg: CompiledFloorConfig | Dict[str, Any], sample_frames: int = 16) -> List[Seat]:
+	"""
+	Run YOLO on a short clip from stream_path, update DB seats for this floor,
+	and return updated Seat rows. Accepts a compiled config from the floor
+	registry or a raw config dict (compiled on the fly).
+	"""
+	# Offline rollover handling
+	now_ts = int(time.time())
+	try:
+		perform_rollovers_if_needed(db, now_ts)
+	except Exception:
+		# best-effort; don't block detection
+		pass
+	cfg = floor_cfg if isinstance(floor_cfg, CompiledFloorConfig) else compile_floor_config(floor_cfg)
+	floor_id = cfg.floor_id
+	stream_path = cfg.stream_path
+	seat_ids = cfg.seat_ids
+
+	existing = _ensure_seats(db, cfg)
+
+	# Initialize counters, indexed like seat_ids
+	person_counts = np.zeros(cfg.num_seats, dtype=np.int64)
+	object_counts = np.zeros(cfg.num_seats, dtype=np.int64)
+	counted_frames = 0
+
+	# Frames come from the floor's decoder thread, which reads ahead while we infer
+	source = get_video_source(floor_id, stream_path)
+	if not source.is_opened():
+		# If stream can't open, do nothing
+		return list(existing.values())
+	# Backends that decode below stream resolution get the ROIs in their frame coordinates
+	cfg = cfg.scaled(*source.scale)
+
+	# Inference may run out of process, so don't load the detector here (nor at all for the classifier engine)
+	inference = get_inference_queue() if get_seat_classifier() is None else None
+
+	# One window of the source per refresh (default: fps frames spread over the refresh interval)
+	sample_frames = source.window
+
+	try:
+		batch_size = max(1, int(os.getenv("INFERENCE_BATCH_SIZE", "8")))
+	except Exception:
+		batch_size = 8
+
+	# With REFRESH_BUDGET_MS only as many frames as fit the budget are processed
+	budget = get_frame_budget(floor_id)
+	keep = None
+	if budget is not None:
+		keep = set(budget.plan(sample_frames).tolist())
+		pipeline_stats.set(floor_id, "budget_frames", len(keep))
+	planned = len(keep) if keep is not None else sample_frames
+	# With SEQUENTIAL_STOP, stop as soon as every seat's decision is settled
+	sequential = get_sequential_stop(PRESENCE_RATIO)
+
+	gate_on = motion_gate_enabled()
+	seat_gate_on = seat_change_enabled()
+	# TRACKING replaces the motion gate; tracks live for one refresh window
+	tracker = make_tracker() if tracking_enabled() else None
+	seat_gate = None
+	last_inferred_crops: np.ndarray | None = None
+	started = time.perf_counter()
+	# Take up to batch_size sampled frames, then run them through one batched forward
+	for frames in _sampled_batches(source, sample_frames, batch_size, keep):
+		frame_size = (frames[0].shape[1], frames[0].shape[0])
+		# Seat lookup goes through the floor's rasterized label map (compiled once per config)
+		label_map = get_label_map(floor_id, cfg.polygons, frame_size, roi_key=cfg.roi_key)
+		person_hits = np.zeros((len(frames), cfg.num_seats), dtype=bool)
+		object_hits = np.zeros((len(frames), cfg.num_seats), dtype=bool)
+
+		if seat_gate_on:
+			# Only frames where some seat's ROI moved away from its reference need inference
+			seat_gate = get_seat_change_detector(cfg, frame_size)
+			crops = [seat_gate.crops(f) for f in frames]
+			need = np.array([seat_gate.changed(c) for c in crops], dtype=bool)
+			pipeline_stats.incr(floor_id, "seat_frames", len(frames))
+			pipeline_stats.incr(floor_id, "seat_skipped", int((~need).sum()))
+		else:
+			need = np.ones(len(frames), dtype=bool)
+		infer_idx = np.flatnonzero(need)
+		if len(infer_idx):
+			p_hits, o_hits = _infer_seat_hits(cfg, [frames[i] for i in infer_idx], inference, label_map, gate_on, tracker)
+			person_hits[infer_idx] = p_hits
+			object_hits[infer_idx] = o_hits
+			if seat_gate_on:
+				last_inferred_crops = crops[infer_idx[-1]]
+				# A seat whose fresh hits contradict its reference is inferred on every frame again
+				for i in range(len(infer_idx)):
+					seat_gate.invalidate(p_hits[i], o_hits[i])
+		if not need.all():
+			person_hits[~need] = seat_gate.ref_person
+			object_hits[~need] = seat_gate.ref_object
+
+		person_counts += person_hits.sum(axis=0)
+		object_counts += object_hits.sum(axis=0)
+		counted_frames += len(frames)
+
+		if sequential is not None and sequential.settled(person_counts, object_counts, counted_frames, planned):
+			pipeline_stats.incr(floor_id, "sequential_stops")
+			pipeline_stats.incr(floor_id, "sequential_saved", planned - counted_frames)
+			break
+		if budget is not None and budget.exhausted((time.perf_counter() - started) * 1000.0, counted_frames):
+			pipeline_stats.incr(floor_id, "budget_exhausted")
+			break
+
+	if budget is not None:
+		budget.update(counted_frames, (time.perf_counter() - started) * 1000.0)
+		pipeline_stats.set(floor_id, "frame_ms_ema", budget.ema_ms or 0.0)
+
+	for prefix in ("motion", "seat"):
+		total = pipeline_stats.get(floor_id, f"{prefix}_frames")
+		if total:
+			pipeline_stats.set(floor_id, f"{prefix}_skip_rate", pipeline_stats.get(floor_id, f"{prefix}_skipped") / total)
+
+	source.finish_window()
+
+	# Apply thresholds
+	now = now_ts
+	frames = max(1, counted_frames)
+	person_ratios = person_counts / frames
+	object_ratios = object_counts / frames
+
+	if seat_gate is not None and last_inferred_crops is not None:
+		# Refresh references of seats whose decision is far from the threshold
+		try:
+			margin = float(os.getenv("SEAT_CHANGE_MARGIN", "0.2"))
+		except Exception:
+			margin = 0.2
+		confident = (np.abs(person_ratios - PRESENCE_RATIO) >= margin) & (np.abs(object_ratios - PRESENCE_RATIO) >= margin)
+		seat_gate.commit(
+			last_inferred_crops, confident, person_ratios >= PRESENCE_RATIO, object_ratios >= PRESENCE_RATIO,
+		)
+
+	_apply_seat_decisions(
+		db,
+		[existing[seat_id] for seat_id in seat_ids],
+		person_ratios >= PRESENCE_RATIO,
+		object_ratios >= PRESENCE_RATIO,
+		now,
+	)
+
 	db.commit()
 	return list(existing.values())
 
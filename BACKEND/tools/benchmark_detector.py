@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.services.yolo_service import Detection, YOLODetector
+
+
+def load_images(pattern: str) -> List[np.ndarray]:
+	paths = sorted(glob.glob(pattern))
+	images = [cv2.imread(p) for p in paths]
+	images = [im for im in images if im is not None]
+	if not images:
+		raise SystemExit(f"No images matched: {pattern}")
+	return images
+
+
+def _iou(a: Detection, b: Detection) -> float:
+	iw = max(0.0, min(a.x2, b.x2) - max(a.x1, b.x1))
+	ih = max(0.0, min(a.y2, b.y2) - max(a.y1, b.y1))
+	inter = iw * ih
+	union = (a.x2 - a.x1) * (a.y2 - a.y1) + (b.x2 - b.x1) * (b.y2 - b.y1) - inter
+	if union <= 0:
+		# Degenerate (zero-area) boxes only match themselves
+		return 1.0 if (a.x1, a.y1, a.x2, a.y2) == (b.x1, b.y1, b.x2, b.y2) else 0.0
+	return inter / union
+
+
+def agreement(reference: List[List[Detection]], candidate: List[List[Detection]], iou_th: float = 0.5) -> float:
+	"""
+	Fraction of reference detections matched by a same-class candidate detection with IoU >= iou_th.
+	"""
+	total = matched = 0
+	for ref_dets, cand_dets in zip(reference, candidate):
+		used = set()
+		for r in ref_dets:
+			total += 1
+			best, best_iou = -1, iou_th
+			for j, c in enumerate(cand_dets):
+				if j in used or c.cls_name != r.cls_name:
+					continue
+				iou = _iou(r, c)
+				if iou >= best_iou:
+					best, best_iou = j, iou
+			if best >= 0:
+				used.add(best)
+				matched += 1
+	return matched / total if total else 1.0
+
+
+def benchmark(
+	detect: Callable[[List[np.ndarray]], List[List[Detection]]],
+	images: List[np.ndarray],
+	batch: int,
+	repeats: int,
+) -> Tuple[float, List[List[Detection]]]:
+	"""Return (mean ms per frame, detections of the last repeat)."""
+	detect(images[:batch])  # warmup
+	dets: List[List[Detection]] = []
+	start = time.perf_counter()
+	for _ in range(repeats):
+		dets = []
+		for i in range(0, len(images), batch):
+			dets.extend(detect(images[i:i + batch]))
+	elapsed = time.perf_counter() - start
+	return elapsed * 1000.0 / (repeats * len(images)), dets
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Benchmark YOLODetector inference modes on still images")
+	parser.add_argument("--images", default=str(PROJECT_ROOT / "input" / "single" / "*.jpg"))
+	parser.add_argument("--size", default=None, help="Resize images to WxH first, e.g. 1920x1080")
+	parser.add_argument("--batch", type=int, default=1)
+	parser.add_argument("--repeats", type=int, default=3)
+	args = parser.parse_args()
+
+	images = load_images(args.images)
+	if args.size:
+		w, h = (int(v) for v in args.size.lower().split("x"))
+		images = [cv2.resize(im, (w, h), interpolation=cv2.INTER_AREA) for im in images]
+
+	modes: Dict[str, Callable[[], YOLODetector]] = {
+		"square": lambda: YOLODetector(rect=False),
+		"rect": lambda: YOLODetector(rect=True),
+		"all": lambda: YOLODetector(rect=False, class_names="all"),
+		"script": lambda: YOLODetector(rect=False, backend="torchscript"),
+		"onnx": lambda: YOLODetector(rect=False, backend="onnxruntime"),
+	}
+
+	reference = None
+	print(f"{len(images)} images, batch {args.batch}, {args.repeats} repeats")
+	print(f"{'mode':<10}{'input':>12}{'ms/frame':>12}{'dets':>8}{'agree':>8}")
+	for name, factory in modes.items():
+		detector = factory()
+		# load_backend falls back to torch when the ONNX model or onnxruntime is missing
+		if name == "onnx" and detector.backend.name != "onnxruntime":
+			print(f"{name:<10}skipped: fell back to {detector.backend.name}")
+			continue
+		ms, dets = benchmark(detector.detect_frames, images, args.batch, args.repeats)
+		if reference is None:
+			reference = dets
+		inp_h, inp_w = detector.input_shape(images[:1])
+		print(f"{name:<10}{f'{inp_w}x{inp_h}':>12}{ms:>12.1f}{sum(map(len, dets)):>8}{agreement(reference, dets):>8.3f}")
+
+
+if __name__ == "__main__":
+	main()
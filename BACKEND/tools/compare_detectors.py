@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.services.roi_index import SeatLabelMap
+from backend.services.roi_loader import CompiledFloorConfig, compile_floor_config, list_floor_ids, load_floor_config
+from backend.services.yolo_service import OBJECT_NAMES_DEFAULT, PERSON_NAME, PRESENCE_RATIO, YOLODetector
+from tools.benchmark_detector import agreement
+
+# Evaluation set name -> (windows of frames, floor config or None for still images)
+EvalSets = Dict[str, Tuple[List[List[np.ndarray]], Optional[CompiledFloorConfig]]]
+
+# Seat decisions of one refresh window, as _apply_seat_decisions sees them
+EMPTY, OCCUPIED, OBJECT_ONLY = 0, 1, 2
+
+
+def sample_windows(video: str, windows: int, window: int, seconds: float) -> List[List[np.ndarray]]:
+	"""
+	Up to windows refresh-like windows spread evenly over a video file, each
+	holding window frames spread evenly over seconds of video (as VideoSource
+	samples one refresh).
+	"""
+	cap = cv2.VideoCapture(video)
+	if not cap.isOpened():
+		print(f"skipping {video}: cannot open")
+		return []
+	total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+	span = max(1, min(total, max(window, int(round(fps * seconds)))))
+	starts = np.unique(np.round(np.linspace(0, max(0, total - span), windows)).astype(np.int64)).tolist()
+	# Frame index -> windows it belongs to (short videos can make windows overlap)
+	wanted: Dict[int, List[int]] = {}
+	for w, start in enumerate(starts):
+		for k in range(window):
+			wanted.setdefault(start + k * span // window, []).append(w)
+	out: List[List[np.ndarray]] = [[] for _ in starts]
+	for i in range(min(total, max(wanted) + 1)):
+		if not cap.grab():
+			break
+		if i in wanted:
+			ok, frame = cap.retrieve()
+			if ok:
+				for w in wanted[i]:
+					out[w].append(frame)
+	cap.release()
+	return [w for w in out if w]
+
+
+def load_eval_sets(floors: Optional[List[str]], windows: int, window: int, single: str) -> EvalSets:
+	"""Refresh windows of each floor's stream_path video, plus still images matching single (one window)."""
+	try:
+		seconds = float(os.getenv("REFRESH_INTERVAL_SECONDS", "5"))
+	except Exception:
+		seconds = 5.0
+	# Floors keep their configs for seat-level agreement; still images only compare detections
+	sets: EvalSets = {}
+	for floor_id in floors or list_floor_ids():
+		cfg = compile_floor_config(load_floor_config(floor_id))
+		sampled = sample_windows(cfg.stream_path, windows, window, seconds)
+		if sampled:
+			sets[floor_id] = (sampled, cfg)
+	if single:
+		images = [im for im in (cv2.imread(p) for p in sorted(glob.glob(single))) if im is not None]
+		if images:
+			sets["single"] = ([images], None)
+	if not sets:
+		raise SystemExit("No frames: no floor video could be opened and no images matched")
+	return sets
+
+
+def seat_hits(dets_per_frame, label_map: SeatLabelMap) -> np.ndarray:
+	"""(frames, 2, seats) person/object hits, counted like refresh_floor."""
+	out = np.zeros((len(dets_per_frame), 2, label_map.num_seats), dtype=bool)
+	for k, dets in enumerate(dets_per_frame):
+		out[k, 0] = label_map.seat_hits(np.array([d.center for d in dets if d.cls_name == PERSON_NAME], dtype=np.float64))
+		out[k, 1] = label_map.seat_hits(np.array([d.center for d in dets if d.cls_name in OBJECT_NAMES_DEFAULT], dtype=np.float64))
+	return out
+
+
+def seat_decisions(hits: np.ndarray) -> np.ndarray:
+	"""Per-seat decision of one window's (frames, 2, seats) hits, thresholded like refresh_floor."""
+	ratios = hits.mean(axis=0)
+	person, obj = ratios[0] >= PRESENCE_RATIO, ratios[1] >= PRESENCE_RATIO
+	return np.where(person, OCCUPIED, np.where(obj, OBJECT_ONLY, EMPTY))
+
+
+def _timed(detector: YOLODetector, frames: List[np.ndarray], batch: int) -> Tuple[float, list]:
+	detector.detect_frames(frames[:batch])  # warmup
+	dets = []
+	start = time.perf_counter()
+	for i in range(0, len(frames), batch):
+		dets.extend(detector.detect_frames(frames[i:i + batch]))
+	return (time.perf_counter() - start) * 1000.0 / max(1, len(frames)), dets
+
+
+def compare(
+	reference: YOLODetector,
+	candidate: YOLODetector,
+	sets: EvalSets,
+	batch: int,
+	min_agreement: float,
+	labels: Tuple[str, str] = ("ref", "cand"),
+) -> Dict[str, float]:
+	"""
+	Print per-set latency, detection agreement and seat-level agreement of
+	candidate against reference, with an accept/reject verdict per floor.
+	"decision" compares the empty / occupied / object-only decision of every
+	seat per refresh window (PRESENCE_RATIO over the window, as refresh_floor
+	decides); "frame" compares the per-frame person/object hit bits.
+	Returns the decision agreement of every floor.
+	"""
+	ref_col, cand_col = f"{labels[0]} ms", f"{labels[1]} ms"
+	print(f"{'set':<10}{'windows':>8}{'frames':>8}{ref_col:>10}{cand_col:>10}{'det agree':>11}{'decision':>10}{'frame':>8}  verdict")
+	result: Dict[str, float] = {}
+	for name, (windows, cfg) in sets.items():
+		frames = [f for w in windows for f in w]
+		ref_ms, ref_dets = _timed(reference, frames, batch)
+		cand_ms, cand_dets = _timed(candidate, frames, batch)
+		det_agree = agreement(ref_dets, cand_dets)
+		head = f"{name:<10}{len(windows):>8}{len(frames):>8}{ref_ms:>10.1f}{cand_ms:>10.1f}{det_agree:>11.3f}"
+		if cfg is None:
+			print(f"{head}{'-':>10}{'-':>8}  -")
+			continue
+		label_map = SeatLabelMap(cfg.polygons, (frames[0].shape[1], frames[0].shape[0]))
+		ref_hits, cand_hits = seat_hits(ref_dets, label_map), seat_hits(cand_dets, label_map)
+		frame_agree = float((ref_hits == cand_hits).mean())
+		decisions = []
+		start = 0
+		for w in windows:
+			end = start + len(w)
+			decisions.append(seat_decisions(ref_hits[start:end]) == seat_decisions(cand_hits[start:end]))
+			start = end
+		decision_agree = float(np.mean(decisions))
+		verdict = "accept" if decision_agree >= min_agreement else "reject"
+		print(f"{head}{decision_agree:>10.3f}{frame_agree:>8.3f}  {verdict}")
+		result[name] = decision_agree
+	return result
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(
+		description="Compare a candidate detector (e.g. a distilled student) against a reference on seat-level occupancy"
+	)
+	parser.add_argument("--reference", default=str(PROJECT_ROOT / "yolov11" / "weights" / "yolo11x.pt"))
+	parser.add_argument("--candidate", required=True, help="Candidate checkpoint, e.g. yolov11/weights/best.pt from main.py --distill")
+	parser.add_argument("--reference-backend", default="torch", choices=("torch", "torchscript", "onnxruntime"))
+	parser.add_argument("--candidate-backend", default="torch", choices=("torch", "torchscript", "onnxruntime"))
+	parser.add_argument("--floor", action="append", default=None, help="Floor whose stream_path video is sampled (repeatable); default all")
+	parser.add_argument("--single", default=str(PROJECT_ROOT / "input" / "single" / "*.jpg"), help="Still images to add ('' to skip)")
+	parser.add_argument("--windows", type=int, default=8, help="Refresh windows sampled per floor video")
+	parser.add_argument("--window", type=int, default=8, help="Frames per window, spread over REFRESH_INTERVAL_SECONDS")
+	parser.add_argument("--rect", action="store_true", help="Use rectangular letterbox inputs")
+	parser.add_argument("--batch", type=int, default=4)
+	parser.add_argument("--min-agreement", type=float, default=0.98, help="Seat decision agreement a floor needs to accept the candidate")
+	args = parser.parse_args()
+
+	sets = load_eval_sets(args.floor, args.windows, args.window, args.single)
+	reference = YOLODetector(rect=args.rect, weights=args.reference, backend=args.reference_backend)
+	candidate = YOLODetector(rect=args.rect, weights=args.candidate, backend=args.candidate_backend)
+	compare(reference, candidate, sets, args.batch, args.min_agreement)
+
+
+if __name__ == "__main__":
+	main()
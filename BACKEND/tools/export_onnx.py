@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+YOLO_DIR = PROJECT_ROOT / "yolov11"
+if str(YOLO_DIR) not in sys.path:
+	sys.path.insert(0, str(YOLO_DIR))
+
+from utils import util  # type: ignore  # noqa: E402
+
+
+class _ExportModel(torch.nn.Module):
+	"""nets.nn.YOLO returning only the decoded prediction, with anchors built in the graph."""
+
+	def __init__(self, model: torch.nn.Module) -> None:
+		super().__init__()
+		self.model = model
+		detect = model.detect
+		# The anchor cache keys on concrete shapes; export needs anchors that follow the input size
+		detect.cached_anchors = lambda x: tuple(j.transpose(0, 1) for j in util.make_anchors(x, detect.stride))
+
+	def forward(self, x: torch.Tensor) -> torch.Tensor:
+		return self.model(x)[0]
+
+
+def export(weights: Path, out: Path, opset: int, size: int, fuse: bool) -> torch.nn.Module:
+	ckpt = torch.load(weights.as_posix(), map_location="cpu", weights_only=False)
+	model = ckpt["model"].float().eval()
+	if fuse:
+		model.fuse()
+	wrapped = _ExportModel(model).eval()
+	dummy = torch.zeros(1, 3, size, size)
+	torch.onnx.export(
+		wrapped,
+		(dummy,),
+		out.as_posix(),
+		input_names=["images"],
+		output_names=["output"],
+		dynamic_axes={"images": {0: "batch", 2: "height", 3: "width"}, "output": {0: "batch", 2: "anchors"}},
+		opset_version=opset,
+		dynamo=False,
+	)
+
+	import onnx
+	proto = onnx.load(out.as_posix())
+	stride = int(max(model.stride.max().item(), 32))
+	meta = {"stride": str(stride), "source": weights.name}
+	if ckpt.get("names"):
+		meta["names"] = repr(dict(ckpt["names"]))
+	for key, value in meta.items():
+		entry = proto.metadata_props.add()
+		entry.key, entry.value = key, value
+	onnx.checker.check_model(proto)
+	onnx.save(proto, out.as_posix())
+	return wrapped
+
+
+def verify(wrapped: torch.nn.Module, out: Path, shapes, batch: int, repeats: int) -> None:
+	"""Compare onnxruntime against eager torch on random inputs of each shape."""
+	from backend.services.inference_backend import OnnxRuntimeBackend
+
+	backend = OnnxRuntimeBackend(out)
+	print(f"{'input':>12}{'batch':>7}{'max |diff|':>13}{'torch ms':>11}{'ort ms':>9}")
+	for h, w in shapes:
+		x = torch.rand(batch, 3, h, w)
+		with torch.no_grad():
+			start = time.perf_counter()
+			for _ in range(repeats):
+				ref = wrapped(x)
+			torch_ms = (time.perf_counter() - start) * 1000.0 / repeats
+		backend.infer(x)
+		start = time.perf_counter()
+		for _ in range(repeats):
+			got = backend.infer(x)
+		ort_ms = (time.perf_counter() - start) * 1000.0 / repeats
+		diff = float((ref - got).abs().max()) if ref.shape == got.shape else float("inf")
+		print(f"{f'{w}x{h}':>12}{batch:>7}{diff:>13.5f}{torch_ms:>11.1f}{ort_ms:>9.1f}")
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Export a nets.nn.YOLO checkpoint to ONNX (dynamic batch and input size)")
+	parser.add_argument("--weights", default=str(YOLO_DIR / "weights" / "yolo11x.pt"))
+	parser.add_argument("--out", default=None, help="Output .onnx path; default next to the weights")
+	parser.add_argument("--opset", type=int, default=17)
+	parser.add_argument("--size", type=int, default=640, help="Trace input size")
+	parser.add_argument("--no-fuse", action="store_true", help="Keep Conv and BatchNorm separate")
+	parser.add_argument("--verify", action="store_true", help="Check onnxruntime output against torch at square and 16:9 shapes")
+	parser.add_argument("--batch", type=int, default=2)
+	parser.add_argument("--repeats", type=int, default=3)
+	args = parser.parse_args()
+
+	weights = Path(args.weights)
+	out = Path(args.out) if args.out else weights.with_suffix(".onnx")
+	wrapped = export(weights, out, args.opset, args.size, fuse=not args.no_fuse)
+	print(f"saved {out}")
+	if args.verify:
+		verify(wrapped, out, [(args.size, args.size), ((args.size * 9 // 16 + 31) // 32 * 32, args.size)], args.batch, args.repeats)
+
+
+if __name__ == "__main__":
+	main()
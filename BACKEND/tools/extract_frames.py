@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+import cv2
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.services.roi_loader import compile_floor_config, list_floor_ids, load_floor_config
+from tools.train_seat_classifier import sample_frames
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(
+		description="Extract unlabeled library frames for yolov11/main.py --distill (COCO-style images/ and file lists)"
+	)
+	parser.add_argument("--floor", action="append", default=None, help="Floor id to use (repeatable); default all floors")
+	parser.add_argument("--video", action="append", default=None, help="Recorded video of the (single) floor, repeatable; default its stream_path")
+	parser.add_argument("--frames", type=int, default=500, help="Frames sampled per video")
+	parser.add_argument("--val-every", type=int, default=10, help="Every n-th frame goes to val2017")
+	parser.add_argument("--out", default=str(PROJECT_ROOT / "yolov11" / "library"), help="Dataset root, passed to main.py --data-dir")
+	args = parser.parse_args()
+
+	floor_ids = args.floor or list_floor_ids()
+	if args.video and len(floor_ids) != 1:
+		raise SystemExit("--video needs exactly one --floor")
+
+	out = Path(args.out)
+	lists = {"train2017": [], "val2017": []}
+	for split in lists:
+		(out / "images" / split).mkdir(parents=True, exist_ok=True)
+	# No label files: the teacher provides the targets. Dataset still caches the
+	# (empty) labels next to them, and a cache from earlier frames would be stale
+	(out / "labels").mkdir(exist_ok=True)
+	for split in lists:
+		(out / "labels" / f"{split}.cache").unlink(missing_ok=True)
+	for floor_id in floor_ids:
+		cfg = compile_floor_config(load_floor_config(floor_id))
+		for v, video in enumerate(args.video or [cfg.stream_path]):
+			count = 0
+			for i, frame in enumerate(sample_frames(video, args.frames)):
+				split = "val2017" if args.val_every > 0 and i % args.val_every == args.val_every - 1 else "train2017"
+				name = f"{floor_id}_{v}_{i:05d}.jpg"
+				cv2.imwrite((out / "images" / split / name).as_posix(), frame)
+				# Dataset.load_image resolves ./ against the list file's directory
+				lists[split].append(f"./images/{split}/{name}")
+				count += 1
+			print(f"{floor_id} {video}: {count} frames")
+
+	for split, names in lists.items():
+		(out / f"{split}.txt").write_text("\n".join(names) + "\n", encoding="utf-8")
+		print(f"{split}: {len(names)} frames")
+	print(f"saved {out}")
+
+
+if __name__ == "__main__":
+	main()
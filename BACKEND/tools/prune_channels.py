@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import importlib.util
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import torch
+import yaml
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+YOLO_DIR = PROJECT_ROOT / "yolov11"
+if str(YOLO_DIR) not in sys.path:
+	sys.path.insert(0, str(YOLO_DIR))
+
+from nets import nn  # type: ignore  # noqa: E402
+
+
+def _score(m: nn.Conv, method: str) -> torch.Tensor:
+	"""Importance of each output channel of a Conv: BatchNorm |gamma| or filter L1 norm."""
+	if method == "bn":
+		return m.norm.weight.detach().abs()
+	return m.conv.weight.detach().abs().sum((1, 2, 3))
+
+
+def _keep(scores: torch.Tensor, ratio: float, multiple: int) -> torch.Tensor:
+	"""Indices of the channels to keep, in order; the count is rounded to a multiple for CPU kernels."""
+	c = scores.numel()
+	n = min(c, max(multiple, int(round(c * (1.0 - ratio) / multiple)) * multiple))
+	return scores.argsort(descending=True)[:n].sort().values
+
+
+def _conv2d(old: torch.nn.Conv2d, weight: torch.Tensor, bias: Optional[torch.Tensor], groups: int) -> torch.nn.Conv2d:
+	new = torch.nn.Conv2d(
+		weight.shape[1] * groups, weight.shape[0], old.kernel_size, old.stride, old.padding, old.dilation, groups, bias is not None
+	)
+	new.weight.data = weight.clone()
+	if bias is not None:
+		new.bias.data = bias.clone()
+	return new.to(old.weight.device, old.weight.dtype)
+
+
+def _slice_out(m: nn.Conv, keep: torch.Tensor, depthwise: bool = False) -> None:
+	"""Keep only the given output channels of a Conv (and its BatchNorm)."""
+	conv, norm = m.conv, m.norm
+	bias = conv.bias.data[keep] if conv.bias is not None else None
+	m.conv = _conv2d(conv, conv.weight.data[keep], bias, len(keep) if depthwise else conv.groups)
+	new = torch.nn.BatchNorm2d(len(keep), norm.eps, norm.momentum).to(norm.weight.device)
+	new.weight.data = norm.weight.data[keep].clone()
+	new.bias.data = norm.bias.data[keep].clone()
+	new.running_mean = norm.running_mean[keep].clone()
+	new.running_var = norm.running_var[keep].clone()
+	new.num_batches_tracked = norm.num_batches_tracked.clone()
+	m.norm = new
+
+
+def _slice_in(conv: torch.nn.Conv2d, cols: torch.Tensor) -> torch.nn.Conv2d:
+	"""A copy of a dense Conv2d reading only the given input channels."""
+	bias = conv.bias.data if conv.bias is not None else None
+	return _conv2d(conv, conv.weight.data[:, cols], bias, 1)
+
+
+def prune_channels(model: torch.nn.Module, ratio: float, method: str = "bn", multiple: int = 8) -> torch.nn.Module:
+	"""
+	Physically remove the least important fraction of channels from every
+	channel group of a nets.nn.YOLO model that has a single consumer: the
+	strided Backbone/Head convs, Residual and PSA feed-forward hidden layers,
+	the CSPBlock shortcut branch, the SPP branch, and the hidden convs of the
+	Detect box and class branches. Channels feeding residual sums, chunks or
+	the Backbone -> Head -> Detect feature maps keep their width, so the
+	module graph and forward code stay unchanged. The model must not be
+	fused (BatchNorm provides the bn scores).
+	"""
+	if any(isinstance(m, nn.Conv) and not hasattr(m, "norm") for m in model.modules()):
+		raise ValueError("Model is fused; prune the training checkpoint")
+	for m in list(model.modules()):
+		if isinstance(m, nn.Backbone):
+			# Each stage opens with a strided Conv read only by the next layer
+			pairs = [(m.p1[0], m.p2[0])] + [(stage[0], stage[1].conv1) for stage in (m.p2, m.p3, m.p4, m.p5)]
+			for conv, consumer in pairs:
+				keep = _keep(_score(conv, method), ratio, multiple)
+				_slice_out(conv, keep)
+				consumer.conv = _slice_in(consumer.conv, keep)
+		elif isinstance(m, nn.Head):
+			# h3 / h5 come first in the concat read by h4 / h6
+			for conv, consumer in ((m.h3, m.h4.conv1), (m.h5, m.h6.conv1)):
+				c = conv.conv.out_channels
+				keep = _keep(_score(conv, method), ratio, multiple)
+				_slice_out(conv, keep)
+				consumer.conv = _slice_in(consumer.conv, torch.cat((keep, torch.arange(c, consumer.conv.in_channels))))
+		elif isinstance(m, nn.Residual) and m.conv2.conv.groups == 1:
+			keep = _keep(_score(m.conv1, method), ratio, multiple)
+			_slice_out(m.conv1, keep)
+			m.conv2.conv = _slice_in(m.conv2.conv, keep)
+		elif isinstance(m, nn.CSPBlock):
+			offset = m.conv1.conv.out_channels
+			keep = _keep(_score(m.conv2, method), ratio, multiple)
+			_slice_out(m.conv2, keep)
+			m.conv3.conv = _slice_in(m.conv3.conv, torch.cat((torch.arange(offset), keep + offset)))
+		elif isinstance(m, nn.SPP):
+			# conv1 output is concatenated with three max-pooled copies of itself
+			c = m.conv1.conv.out_channels
+			keep = _keep(_score(m.conv1, method), ratio, multiple)
+			_slice_out(m.conv1, keep)
+			m.conv2.conv = _slice_in(m.conv2.conv, torch.cat([keep + k * c for k in range(4)]))
+		elif isinstance(m, nn.PSABlock):
+			keep = _keep(_score(m.ffn[0], method), ratio, multiple)
+			_slice_out(m.ffn[0], keep)
+			m.ffn[1].conv = _slice_in(m.ffn[1].conv, keep)
+		elif isinstance(m, nn.Detect):
+			for box, cls in zip(m.box, m.cls):
+				for i in range(2):
+					keep = _keep(_score(box[i], method), ratio, multiple)
+					_slice_out(box[i], keep)
+					if i == 0:
+						box[1].conv = _slice_in(box[1].conv, keep)
+					else:
+						box[2] = _slice_in(box[2], keep)
+				# 1x1 conv -> depthwise 3x3 -> 1x1 conv: the depthwise conv follows the same channels
+				keep = _keep(_score(cls[0][1], method), ratio, multiple)
+				_slice_out(cls[0][1], keep)
+				_slice_out(cls[1][0], keep, depthwise=True)
+				cls[1][1].conv = _slice_in(cls[1][1].conv, keep)
+				keep = _keep(_score(cls[1][1], method), ratio, multiple)
+				_slice_out(cls[1][1], keep)
+				cls[2] = _slice_in(cls[2], keep)
+	# Cached anchors follow the feature map shapes only, but start clean anyway
+	model.detect.__dict__.pop("anchor_cache", None)
+	return model
+
+
+def _params(model: torch.nn.Module) -> int:
+	return sum(p.numel() for p in model.parameters())
+
+
+@torch.no_grad()
+def _latency(model: torch.nn.Module, size: int, repeats: int) -> float:
+	"""CPU milliseconds per 1 x 3 x size x size forward of the fused model."""
+	fused = copy.deepcopy(model).float().cpu().fuse().eval()
+	x = torch.rand(1, 3, size, size)
+	fused(x)
+	start = time.perf_counter()
+	for _ in range(repeats):
+		fused(x)
+	return (time.perf_counter() - start) * 1000.0 / repeats
+
+
+def _mean_ap(model: torch.nn.Module, data_dir: str, size: int, batch: int) -> Optional[Tuple[float, float]]:
+	"""(mAP@50, mAP@50-95) from yolov11/main.py validate on a labelled data dir; needs CUDA."""
+	if not data_dir:
+		return None
+	if not torch.cuda.is_available():
+		print("mAP needs CUDA (yolov11/main.py validate); skipping")
+		return None
+	# Load yolov11/main.py by path rather than relying on `main` resolving to it on sys.path
+	spec = importlib.util.spec_from_file_location("yolo_main", YOLO_DIR / "main.py")
+	yolo_main = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(yolo_main)
+	with (YOLO_DIR / "utils" / "args.yaml").open("r", encoding="utf-8") as f:
+		params = yaml.safe_load(f)
+	args = argparse.Namespace(data_dir=data_dir, batch_size=batch, inp_size=size, num_cls=model.detect.nc, plot=False)
+	_, _, map50, mean_ap = yolo_main.validate(args, params, copy.deepcopy(model).float().cuda())
+	return float(map50), float(mean_ap)
+
+
+def _load(path: Path) -> dict:
+	return torch.load(path.as_posix(), map_location="cpu", weights_only=False)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(
+		description="Structured channel pruning of a nets.nn.YOLO checkpoint (fine-tune afterwards with yolov11/main.py --train --weights)"
+	)
+	parser.add_argument("--weights", default=str(YOLO_DIR / "weights" / "yolo11x.pt"))
+	parser.add_argument("--ratio", type=float, action="append", default=None, help="Fraction of channels removed per group (repeatable); default 0.25")
+	parser.add_argument("--method", choices=("bn", "l1"), default="bn", help="Rank channels by BatchNorm |gamma| or filter L1 norm")
+	parser.add_argument("--multiple", type=int, default=8, help="Kept channel counts are rounded to this multiple")
+	parser.add_argument("--evaluate", nargs="+", default=None, help="Report these checkpoints (e.g. fine-tuned) against --weights instead of pruning")
+	parser.add_argument("--data-dir", default="", help="Labelled data dir for mAP (main.py --data-dir layout); skipped when empty")
+	parser.add_argument("--batch", type=int, default=16, help="Validation batch size")
+	parser.add_argument("--size", type=int, default=640)
+	parser.add_argument("--repeats", type=int, default=5)
+	args = parser.parse_args()
+
+	weights = Path(args.weights)
+	ckpt = _load(weights)
+	base = ckpt["model"].float().eval()
+	rows: List[Tuple[str, torch.nn.Module]] = [(weights.name, base)]
+	if args.evaluate:
+		rows += [(Path(p).name, _load(Path(p))["model"].float().eval()) for p in args.evaluate]
+	else:
+		# Checkpoints from main.py are stored in fp16; save the pruned ones the same way
+		half = next(ckpt["model"].parameters()).dtype == torch.float16
+		for ratio in args.ratio or [0.25]:
+			pruned = prune_channels(copy.deepcopy(base), ratio, args.method, args.multiple)
+			out = weights.with_name(f"{weights.stem}-p{int(round(ratio * 100))}.pt")
+			pruned_ckpt = {k: v for k, v in ckpt.items() if k != "model"}
+			pruned_ckpt["model"] = copy.deepcopy(pruned).half() if half else pruned
+			torch.save(pruned_ckpt, out.as_posix())
+			print(f"saved {out}")
+			rows.append((out.name, pruned))
+
+	base_params = _params(base)
+	print(f"{'model':<24}{'params M':>10}{'sparsity':>10}{'cpu ms':>9}{'mAP@50':>9}{'mAP':>8}")
+	for name, model in rows:
+		n = _params(model)
+		ms = _latency(model, args.size, args.repeats)
+		ap = _mean_ap(model, args.data_dir, args.size, args.batch)
+		ap_cols = f"{ap[0]:>9.3f}{ap[1]:>8.3f}" if ap else f"{'-':>9}{'-':>8}"
+		print(f"{name:<24}{n / 1e6:>10.2f}{1 - n / base_params:>10.1%}{ms:>9.1f}{ap_cols}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+import yaml
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+YOLO_DIR = PROJECT_ROOT / "yolov11"
+if str(YOLO_DIR) not in sys.path:
+	sys.path.insert(0, str(YOLO_DIR))
+
+from backend.services.yolo_service import OBJECT_NAMES_DEFAULT, PERSON_NAME
+
+
+def checkpoint_names(ckpt: dict) -> Dict[int, str]:
+	"""Class names of a checkpoint: its own mapping, else the COCO names in args.yaml."""
+	if ckpt.get("names"):
+		return {int(k): v for k, v in ckpt["names"].items()}
+	with (YOLO_DIR / "utils" / "args.yaml").open("r", encoding="utf-8") as f:
+		return {int(k): v for k, v in yaml.safe_load(f)["names"].items()}
+
+
+def prune_classes(model: torch.nn.Module, keep: List[int]) -> torch.nn.Module:
+	"""
+	Slice the final class conv of every Detect level down to the keep indices
+	(in that order) and update nc / no. Box branches and the hidden class
+	convs are untouched, so kept logits are bit-identical to the original.
+	"""
+	detect = model.detect
+	index = torch.as_tensor(keep, dtype=torch.long)
+	for branch in detect.cls:
+		old = branch[-1]
+		new = torch.nn.Conv2d(old.in_channels, len(keep), old.kernel_size, old.stride, old.padding, bias=old.bias is not None)
+		new.weight.data = old.weight.data[index].clone()
+		if old.bias is not None:
+			new.bias.data = old.bias.data[index].clone()
+		branch[-1] = new.to(old.weight.device, old.weight.dtype)
+	detect.nc = len(keep)
+	detect.no = detect.nc + detect.reg_max * 4
+	# Cached anchors do not depend on nc, but start clean anyway
+	detect.__dict__.pop("anchor_cache", None)
+	return model
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Prune the detection head of a nets.nn.YOLO checkpoint to a class subset")
+	parser.add_argument("--weights", default=str(YOLO_DIR / "weights" / "yolo11x.pt"))
+	parser.add_argument("--classes", default="library", help="'library' (person + seat objects) or comma-separated class names")
+	parser.add_argument("--out", default=None, help="Output checkpoint; default <weights>-<classes>.pt")
+	parser.add_argument("--size", type=int, default=640, help="Input size of the equivalence and latency check")
+	parser.add_argument("--repeats", type=int, default=3)
+	args = parser.parse_args()
+
+	weights = Path(args.weights)
+	ckpt = torch.load(weights.as_posix(), map_location="cpu", weights_only=False)
+	# Checkpoints from main.py are stored in fp16; save the pruned one the same way
+	half = next(ckpt["model"].parameters()).dtype == torch.float16
+	model = ckpt["model"].float().eval()
+	names = checkpoint_names(ckpt)
+
+	if args.classes.strip().lower() == "library":
+		wanted = [PERSON_NAME] + sorted(OBJECT_NAMES_DEFAULT)
+		suffix = "library"
+	else:
+		wanted = [c.strip() for c in args.classes.split(",") if c.strip()]
+		suffix = f"{len(wanted)}cls"
+	by_name = {v: k for k, v in names.items()}
+	missing = [c for c in wanted if c not in by_name]
+	if missing:
+		raise SystemExit(f"Unknown class names: {', '.join(missing)}")
+	keep = [by_name[c] for c in wanted]
+
+	x = torch.rand(1, 3, args.size, args.size)
+	with torch.no_grad():
+		start = time.perf_counter()
+		for _ in range(args.repeats):
+			full = model(x)[0]
+		full_ms = (time.perf_counter() - start) * 1000.0 / args.repeats
+
+		prune_classes(model, keep)
+		start = time.perf_counter()
+		for _ in range(args.repeats):
+			pruned = model(x)[0]
+		pruned_ms = (time.perf_counter() - start) * 1000.0 / args.repeats
+
+	expected = torch.cat((full[:, :4], full[:, 4 + torch.as_tensor(keep)]), 1)
+	print(f"classes: {len(names)} -> {len(keep)} ({', '.join(wanted)})")
+	print(f"output: {tuple(full.shape)} -> {tuple(pruned.shape)}, max |diff| on kept classes {float((expected - pruned).abs().max()):.2e}")
+	print(f"forward {args.size}x{args.size}: {full_ms:.1f} -> {pruned_ms:.1f} ms")
+
+	out = Path(args.out) if args.out else weights.with_name(f"{weights.stem}-{suffix}.pt")
+	pruned_ckpt = {k: v for k, v in ckpt.items() if k not in ("model", "names")}
+	pruned_ckpt["model"] = model.half() if half else model
+	pruned_ckpt["names"] = {i: name for i, name in enumerate(wanted)}
+	torch.save(pruned_ckpt, out.as_posix())
+	print(f"saved {out}")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.services.roi_loader import CompiledFloorConfig
+from backend.services.yolo_service import YOLODetector
+from tools.compare_detectors import compare, load_eval_sets
+from tools.export_onnx import export
+
+
+def calibration_batches(detector: YOLODetector, frames: List[np.ndarray]) -> List[np.ndarray]:
+	"""Frames preprocessed exactly like detect_frames, one float32 NCHW batch of 1 each."""
+	batches = []
+	for frame in frames:
+		buf = np.zeros((1, 3) + detector.input_shape([frame]), dtype=np.uint8)
+		detector._letterbox_into(frame, buf[0])
+		batches.append(buf.astype(np.float32) / 255)
+	return batches
+
+
+def quantize(fp32_path: Path, out: Path, batches: List[np.ndarray], method: str) -> None:
+	"""
+	Static QDQ quantization (per-channel int8 weights, uint8 activations).
+	The box decoding at the end of Detect stays in float: boxes in pixels and
+	class scores in [0, 1] share its concat and would not survive one scale.
+	"""
+	import onnx
+	from onnxruntime.quantization import CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+	from onnxruntime.quantization.shape_inference import quant_pre_process
+
+	class Reader(CalibrationDataReader):
+		def __init__(self) -> None:
+			self._it = iter(batches)
+
+		def get_next(self):
+			x = next(self._it, None)
+			return None if x is None else {"images": x}
+
+	pre = out.with_suffix(".pre.onnx")
+	quant_pre_process(fp32_path.as_posix(), pre.as_posix(), skip_symbolic_shape=True)
+	try:
+		exclude = [
+			n.name for n in onnx.load(pre.as_posix()).graph.node
+			if n.name.startswith("/model/detect/") and "/box." not in n.name and "/cls." not in n.name
+		]
+		methods = {"minmax": CalibrationMethod.MinMax, "entropy": CalibrationMethod.Entropy, "percentile": CalibrationMethod.Percentile}
+		quantize_static(
+			pre.as_posix(),
+			out.as_posix(),
+			Reader(),
+			quant_format=QuantFormat.QDQ,
+			activation_type=QuantType.QUInt8,
+			weight_type=QuantType.QInt8,
+			per_channel=True,
+			nodes_to_exclude=exclude,
+			calibrate_method=methods[method],
+		)
+	finally:
+		pre.unlink(missing_ok=True)
+
+
+def _split(windows: List[List[np.ndarray]], cfg: Optional[CompiledFloorConfig]) -> Tuple[List[List[np.ndarray]], List[List[np.ndarray]]]:
+	"""(calibration, held-out) windows: even / odd windows of a floor, even / odd images of the still set."""
+	if cfg is None:
+		images = windows[0]
+		return [images[0::2]], [images[1::2] or images]
+	return windows[0::2], windows[1::2] or windows
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="INT8 static post-training quantization of the YOLO detector (onnxruntime)")
+	parser.add_argument("--weights", default=str(PROJECT_ROOT / "yolov11" / "weights" / "yolo11x.pt"))
+	parser.add_argument("--out", default=None, help="Output path; default <weights>.int8.onnx")
+	parser.add_argument("--floor", action="append", default=None, help="Floor whose stream_path video is sampled (repeatable); default all")
+	parser.add_argument("--single", default=str(PROJECT_ROOT / "input" / "single" / "*.jpg"), help="Still images to add ('' to skip)")
+	parser.add_argument("--windows", type=int, default=8, help="Refresh windows sampled per floor video; even ones calibrate, odd ones evaluate")
+	parser.add_argument("--window", type=int, default=8, help="Frames per window")
+	parser.add_argument("--calibration", choices=("minmax", "entropy", "percentile"), default="minmax")
+	parser.add_argument("--rect", action="store_true", help="Calibrate and evaluate with rectangular letterbox inputs")
+	parser.add_argument("--batch", type=int, default=4)
+	parser.add_argument("--min-agreement", type=float, default=0.98, help="Seat decision agreement a floor needs to accept INT8")
+	args = parser.parse_args()
+
+	weights = Path(args.weights)
+	out = Path(args.out) if args.out else weights.with_suffix(".int8.onnx")
+	fp32_onnx = weights.with_suffix(".onnx")
+	if not fp32_onnx.exists():
+		export(weights, fp32_onnx, opset=17, size=640, fuse=True)
+		print(f"exported {fp32_onnx}")
+
+	sets = load_eval_sets(args.floor, args.windows, args.window, args.single)
+	reference = YOLODetector(rect=args.rect, weights=weights, backend="torch")
+	splits = {name: _split(windows, cfg) for name, (windows, cfg) in sets.items()}
+	calib = [f for calib_windows, _ in splits.values() for w in calib_windows for f in w]
+	start = time.perf_counter()
+	quantize(fp32_onnx, out, calibration_batches(reference, calib), args.calibration)
+	print(f"saved {out} ({len(calib)} calibration frames, {time.perf_counter() - start:.1f}s)")
+
+	quantized = YOLODetector(rect=args.rect, weights=out, backend="onnxruntime")
+	held_out = {name: (splits[name][1], cfg) for name, (_, cfg) in sets.items()}
+	compare(reference, quantized, held_out, args.batch, args.min_agreement, labels=("fp32", "int8"))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+import torch
+
+# Ensure project root is on sys.path so `import backend` works even if CWD is tools/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+	sys.path.insert(0, str(PROJECT_ROOT))
+
+from backend.services.roi_index import SeatLabelMap
+from backend.services.roi_loader import CompiledFloorConfig, compile_floor_config, list_floor_ids, load_floor_config
+from backend.services.seat_classifier import CLASSES, EMPTY, OBJECT, PERSON, SeatCropNet, SeatWarper, classifier_weights_path
+from backend.services.yolo_service import OBJECT_NAMES_DEFAULT, PERSON_NAME, YOLODetector
+
+
+def sample_frames(video: str, count: int):
+	"""Yield up to count frames spread evenly over a video file."""
+	cap = cv2.VideoCapture(video)
+	if not cap.isOpened():
+		raise SystemExit(f"Failed to open video: {video}")
+	total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	wanted = set(np.unique(np.round(np.linspace(0, max(0, total - 1), count)).astype(np.int64)).tolist())
+	try:
+		for i in range(total):
+			if not cap.grab():
+				break
+			if i in wanted:
+				ok, frame = cap.retrieve()
+				if ok:
+					yield frame
+	finally:
+		cap.release()
+
+
+def seat_labels(dets, label_map: SeatLabelMap) -> np.ndarray:
+	"""Per-seat class from one frame's detections, the way refresh_floor counts hits."""
+	person_pts = np.array([d.center for d in dets if d.cls_name == PERSON_NAME], dtype=np.float64)
+	object_pts = np.array([d.center for d in dets if d.cls_name in OBJECT_NAMES_DEFAULT], dtype=np.float64)
+	labels = np.full(label_map.num_seats, EMPTY, dtype=np.int64)
+	labels[label_map.seat_hits(object_pts)] = OBJECT
+	labels[label_map.seat_hits(person_pts)] = PERSON
+	return labels
+
+
+def bootstrap(
+	cfg: CompiledFloorConfig,
+	video: str,
+	detector: YOLODetector,
+	frames: int,
+	size: int,
+	batch: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+	"""Warped seat crops of sampled frames labelled by the detector."""
+	crops: List[np.ndarray] = []
+	labels: List[np.ndarray] = []
+	warper = label_map = None
+	pending: List[np.ndarray] = []
+
+	def flush() -> None:
+		for frame, dets in zip(pending, detector.detect_frames(pending)):
+			out = np.empty((cfg.num_seats, size, size, 3), dtype=np.uint8)
+			warper.crops(frame, out)
+			crops.append(out)
+			labels.append(seat_labels(dets, label_map))
+		pending.clear()
+
+	for frame in sample_frames(video, frames):
+		if warper is None:
+			frame_size = (frame.shape[1], frame.shape[0])
+			warper = SeatWarper(cfg, frame_size, size)
+			label_map = SeatLabelMap(cfg.polygons, frame_size)
+		pending.append(frame)
+		if len(pending) >= batch:
+			flush()
+	if pending:
+		flush()
+	if not crops:
+		return np.zeros((0, size, size, 3), dtype=np.uint8), np.zeros(0, dtype=np.int64)
+	return np.concatenate(crops), np.concatenate(labels)
+
+
+def _augment(x: torch.Tensor) -> torch.Tensor:
+	"""Random horizontal flip plus brightness/contrast jitter on a (N, 3, H, W) batch in [0, 1]."""
+	flip = torch.rand(x.shape[0], device=x.device) < 0.5
+	x = torch.where(flip[:, None, None, None], x.flip(3), x)
+	gain = torch.empty(x.shape[0], 1, 1, 1, device=x.device).uniform_(0.75, 1.25)
+	bias = torch.empty(x.shape[0], 1, 1, 1, device=x.device).uniform_(-0.1, 0.1)
+	return (x * gain + bias).clamp_(0, 1)
+
+
+def _to_tensor(crops: np.ndarray) -> torch.Tensor:
+	return torch.from_numpy(np.ascontiguousarray(crops[..., ::-1])).permute(0, 3, 1, 2).float() / 255
+
+
+def train(
+	crops: np.ndarray,
+	labels: np.ndarray,
+	epochs: int,
+	batch: int,
+	lr: float,
+	val_fraction: float,
+	seed: int,
+) -> Tuple[SeatCropNet, np.ndarray]:
+	"""Train on a random split; returns the best-validation model and its confusion matrix."""
+	device = "cuda:0" if torch.cuda.is_available() else "cpu"
+	torch.manual_seed(seed)
+	order = np.random.default_rng(seed).permutation(len(labels))
+	n_val = int(len(order) * val_fraction)
+	val_idx, train_idx = order[:n_val], order[n_val:]
+	x_train, y_train = _to_tensor(crops[train_idx]).to(device), torch.from_numpy(labels[train_idx]).to(device)
+	x_val, y_val = _to_tensor(crops[val_idx]).to(device), torch.from_numpy(labels[val_idx]).to(device)
+
+	# Seats are mostly empty: weight classes by inverse frequency
+	counts = np.bincount(labels[train_idx], minlength=len(CLASSES)).astype(np.float32)
+	weights = torch.from_numpy(counts.sum() / np.maximum(counts, 1.0) / len(CLASSES)).to(device)
+
+	model = SeatCropNet().to(device)
+	optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=1e-4)
+	scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, epochs))
+	criterion = torch.nn.CrossEntropyLoss(weight=weights)
+
+	best_acc, best_state = -1.0, None
+	confusion = np.zeros((len(CLASSES), len(CLASSES)), dtype=np.int64)
+	for epoch in range(epochs):
+		model.train()
+		perm = torch.randperm(len(y_train), device=device)
+		total_loss = 0.0
+		for i in range(0, len(perm), batch):
+			idx = perm[i:i + batch]
+			loss = criterion(model(_augment(x_train[idx])), y_train[idx])
+			optimizer.zero_grad()
+			loss.backward()
+			optimizer.step()
+			total_loss += loss.item() * len(idx)
+		scheduler.step()
+
+		model.eval()
+		with torch.no_grad():
+			pred = torch.cat([model(x_val[i:i + batch]).argmax(1) for i in range(0, len(y_val), batch)]) if len(y_val) else y_val
+		acc = float((pred == y_val).float().mean()) if len(y_val) else 0.0
+		print(f"epoch {epoch + 1:>3}/{epochs}  loss {total_loss / max(1, len(y_train)):.4f}  val acc {acc:.3f}")
+		if acc > best_acc:
+			best_acc = acc
+			best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+			confusion = np.zeros_like(confusion)
+			np.add.at(confusion, (y_val.cpu().numpy(), pred.cpu().numpy()), 1)
+	if best_state is not None:
+		model.load_state_dict(best_state)
+	return model.cpu().eval(), confusion
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(
+		description="Train the per-seat crop classifier on labels bootstrapped from yolo11x detections"
+	)
+	parser.add_argument("--floor", action="append", default=None, help="Floor id to use (repeatable); default all floors")
+	parser.add_argument("--video", action="append", default=None, help="Recorded video of the (single) floor, repeatable; default its stream_path")
+	parser.add_argument("--frames", type=int, default=200, help="Frames sampled per video")
+	parser.add_argument("--size", type=int, default=64, help="Seat crop size")
+	parser.add_argument("--detect-batch", type=int, default=8)
+	parser.add_argument("--cache", default=None, help="npz file for the bootstrapped crops (reused when it exists)")
+	parser.add_argument("--epochs", type=int, default=30)
+	parser.add_argument("--batch", type=int, default=128)
+	parser.add_argument("--lr", type=float, default=2e-3)
+	parser.add_argument("--val", type=float, default=0.2, help="Validation fraction")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--out", default=str(classifier_weights_path()))
+	args = parser.parse_args()
+
+	if args.cache and Path(args.cache).exists():
+		data = np.load(args.cache)
+		crops, labels = data["crops"], data["labels"]
+		if crops.shape[1] != args.size:
+			raise SystemExit(f"Cached crops are {crops.shape[1]}px, not --size {args.size}")
+	else:
+		floor_ids = args.floor or list_floor_ids()
+		if args.video and len(floor_ids) != 1:
+			raise SystemExit("--video needs exactly one --floor")
+		detector = YOLODetector()
+		all_crops, all_labels = [], []
+		for floor_id in floor_ids:
+			cfg = compile_floor_config(load_floor_config(floor_id))
+			for video in args.video or [cfg.stream_path]:
+				crops, labels = bootstrap(cfg, video, detector, args.frames, args.size, args.detect_batch)
+				print(f"{floor_id} {video}: {len(labels)} seat crops")
+				all_crops.append(crops)
+				all_labels.append(labels)
+		crops, labels = np.concatenate(all_crops), np.concatenate(all_labels)
+		if args.cache:
+			np.savez_compressed(args.cache, crops=crops, labels=labels)
+
+	if len(labels) == 0:
+		raise SystemExit("No seat crops were bootstrapped")
+	counts = np.bincount(labels, minlength=len(CLASSES))
+	print("labels: " + ", ".join(f"{name} {n}" for name, n in zip(CLASSES, counts)))
+
+	model, confusion = train(crops, labels, args.epochs, args.batch, args.lr, args.val, args.seed)
+	print("validation confusion (rows: yolo11x label, cols: classifier)")
+	print(f"{'':<8}" + "".join(f"{name:>8}" for name in CLASSES))
+	for name, row in zip(CLASSES, confusion):
+		print(f"{name:<8}" + "".join(f"{n:>8}" for n in row))
+
+	Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+	torch.save({"model": model, "size": args.size, "classes": CLASSES}, args.out)
+	print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+	main()
@@ -18,10 +18,33 @@ from utils import util
 from utils.dataset import Dataset
 
 
+def load_teacher(args, params):
+    # Frozen detector whose outputs the student learns; its classes win
+    ckpt = torch.load(args.teacher, map_location='cuda', weights_only=False)
+    teacher = ckpt['model'].float().fuse().cuda().half().eval()
+    for p in teacher.parameters():
+        p.requires_grad_(False)
+    args.num_cls = teacher.detect.nc
+    if ckpt.get('names'):
+        params['names'] = ckpt['names']
+    return teacher
+
+
 def train(args, params):
     util.init_seeds()
 
-    model = nn.yolo_v11_x(args.num_cls)
+    teacher = load_teacher(args, params) if args.distill else None
+    if args.weights:
+        # Continue from the checkpoint's module, architecture included (e.g. pruned)
+        ckpt = torch.load(args.weights, map_location='cpu', weights_only=False)
+        model = ckpt['model'].float()
+        args.num_cls = model.detect.nc
+        if ckpt.get('names'):
+            params['names'] = ckpt['names']
+    elif args.distill:
+        model = getattr(nn, f'yolo_v11_{args.student}')(args.num_cls)
+    else:
+        model = nn.yolo_v11_x(args.num_cls)
     model.cuda()
 
     if args.distributed:
@@ -55,7 +78,11 @@ def train(args, params):
     linear = lambda x: (max(1 - x / args.epochs, 0) * (1.0 - 0.01) + 0.01)
     scheduler = torch.optim.lr_scheduler.LambdaLR(optimizer, lr_lambda=linear)
     scheduler.last_epoch = - 1
-    criterion = util.DetectionLoss(model)
+    if args.distill:
+        criterion = util.DistillLoss(model, teacher, args.distill_conf, args.kd)
+    else:
+        criterion = util.DetectionLoss(model)
+    loss_names = ['box', 'cls', 'dfl'] + (['kd'] if args.distill else [])
 
 
     opt_step = -1
@@ -66,8 +93,7 @@ def train(args, params):
 
     with open('weights/step.csv', 'w') as log:
         if args.rank == 0:
-            logger = csv.DictWriter(log, fieldnames=['epoch',
-                                                     'box', 'cls', 'dfl',
+            logger = csv.DictWriter(log, fieldnames=['epoch', *loss_names,
                                                      'Recall', 'Precision', 'mAP@50', 'mAP'])
             logger.writeheader()
         for epoch in range(args.epochs):
@@ -84,7 +110,7 @@ def train(args, params):
                 loader.dataset.mosaic = False
 
             if args.rank == 0:
-                print("\n" + "%11s" * 5 % ("Epoch", "GPU", "box", "cls", "dfl"))
+                print("\n" + "%11s" * (2 + len(loss_names)) % ("Epoch", "GPU", *loss_names))
                 p_bar = tqdm.tqdm(enumerate(loader), total=num_batch)
 
             t_loss = None
@@ -103,7 +129,8 @@ def train(args, params):
                 images = batch["img"].cuda().float() / 255
                 with torch.amp.autocast("cuda"):
                     pred = model(images)
-                    loss, loss_items = criterion(pred, batch)
+                    # The distillation targets come from the teacher on the same images
+                    loss, loss_items = criterion(pred, images if args.distill else batch)
                     if args.distributed:
                         loss *= args.world_size
 
@@ -122,18 +149,15 @@ def train(args, params):
                     opt_step = glob_step
 
                 if args.rank == 0:
-                    fmt = "%11s" * 2 + "%11.4g" * 3
+                    fmt = "%11s" * 2 + "%11.4g" * len(loss_names)
                     memory = f'{torch.cuda.memory_reserved() / 1e9:.3g}G'
                     p_bar.set_description(fmt % (f"{epoch + 1}/{args.epochs}", memory, *t_loss))
 
             if args.rank == 0:
-                m_pre, m_rec, map50, mean_map = validate(args, params, ema.ema)
-                box, cls, dfl = map(float, t_loss)
+                m_pre, m_rec, map50, mean_map = validate(args, params, ema.ema, teacher)
 
                 logger.writerow({'epoch': str(epoch + 1).zfill(3),
-                                 'box': str(f'{box:.3f}'),
-                                 'cls': str(f'{cls:.3f}'),
-                                 'dfl': str(f'{dfl:.3f}'),
+                                 **{k: str(f'{float(v):.3f}') for k, v in zip(loss_names, t_loss)},
                                  'mAP': str(f'{mean_map:.3f}'),
                                  'mAP@50': str(f'{map50:.3f}'),
                                  'Recall': str(f'{m_rec:.3f}'),
@@ -141,6 +165,8 @@ def train(args, params):
                 log.flush()
 
                 ckpt = {'epoch': epoch+1, 'model': copy.deepcopy(ema.ema)}
+                if args.distill or args.weights:
+                    ckpt['names'] = params['names']
                 torch.save(ckpt, 'weights/last.pt')
 
                 if mean_map > best_map:
@@ -158,7 +184,8 @@ def train(args, params):
         print("Training complete.")
 
 
-def validate(args, params, model=None):
+def validate(args, params, model=None, teacher=None):
+    # With a teacher, its detections are the ground truth (distillation on unlabeled frames)
     iou_v = torch.linspace(0.5, 0.95, 10)
     n_iou = iou_v.numel()
 
@@ -182,6 +209,12 @@ def validate(args, params, model=None):
         for k in ["idx", "cls", "box"]:
             batch[k] = batch[k].cuda()
 
+        if teacher is not None:
+            with torch.no_grad():
+                targets, _ = teacher(image.half())
+            targets = util.non_max_suppression(targets, args.distill_conf, 0.7)
+            batch.update(util.pseudo_labels(targets, image.shape[2:]))
+
         outputs = util.non_max_suppression(model(image))
 
         metric = util.update_metrics(outputs, batch, n_iou, iou_v, metric)
@@ -245,10 +278,16 @@ def inference(args, params):
             # Scale ratio (new / old)
             r = min(1.0, args.inp_size / height, args.inp_size / width)
 
-            # Compute padding
+            # Compute padding (square, or only up to a stride multiple in rect mode)
             pad = int(round(width * r)), int(round(height * r))
-            w = (args.inp_size - pad[0]) / 2
-            h = (args.inp_size - pad[1]) / 2
+            if args.rect:
+                stride = int(model.stride.max())
+                inp_w = int(np.ceil(pad[0] / stride)) * stride
+                inp_h = int(np.ceil(pad[1] / stride)) * stride
+            else:
+                inp_w = inp_h = args.inp_size
+            w = (inp_w - pad[0]) / 2
+            h = (inp_h - pad[1]) / 2
 
             if (width, height) != pad:  # resize
                 image = cv2.resize(image, pad, interpolation=cv2.INTER_LINEAR)
@@ -312,8 +351,15 @@ def main():
     parser.add_argument('--train', action='store_true')
     parser.add_argument('--validate', action='store_true')
     parser.add_argument('--inference', action='store_true')
+    parser.add_argument('--rect', action='store_true')
     parser.add_argument('--source', type=str, default='input/per2s.mp4')
     parser.add_argument('--output', type=str, default='output/output.mp4')
+    parser.add_argument('--weights', type=str, default='')
+    parser.add_argument('--distill', action='store_true')
+    parser.add_argument('--student', type=str, default='n', choices=('n', 's'))
+    parser.add_argument('--teacher', type=str, default='weights/yolo11x.pt')
+    parser.add_argument('--distill-conf', type=float, default=0.25)
+    parser.add_argument('--kd', type=float, default=1.0)
 
     args = parser.parse_args()
 
@@ -324,7 +370,7 @@ def main():
     with open('utils/args.yaml', errors='ignore') as f:
         params = yaml.safe_load(f)
 
-    if args.train:
+    if args.train or args.distill:
         train(args, params)
     if args.validate:
         validate(args, params)
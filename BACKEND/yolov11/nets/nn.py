@@ -232,8 +232,7 @@ class Detect(nn.Module):
 
         bs = x[0].shape
         x_cat = torch.cat([xi.view(bs[0], self.no, -1) for xi in x], 2)
-        self.anchors, self.strides = (j.transpose(0, 1) for j in
-                                      util.make_anchors(x, self.stride))
+        self.anchors, self.strides = self.cached_anchors(x)
         box, cls = x_cat.split((self.reg_max * 4, self.nc), 1)
         lt, rb = self.dfl(box).chunk(2, 1)
         x1y1 = self.anchors.unsqueeze(0) - lt
@@ -244,6 +243,18 @@ class Detect(nn.Module):
         output = torch.cat((d_box * self.strides, cls.sigmoid()), 1)
         return output, x
 
+    def cached_anchors(self, x):
+        # Anchors depend only on the feature map shapes, so rectangular and
+        # square inputs each build theirs once
+        key = (tuple(tuple(xi.shape[2:]) for xi in x), x[0].dtype, x[0].device)
+        cache = self.__dict__.setdefault('anchor_cache', {})
+        if key not in cache:
+            if len(cache) >= 16:
+                cache.clear()
+            cache[key] = tuple(j.transpose(0, 1) for j in
+                               util.make_anchors(x, self.stride))
+        return cache[key]
+
     def bias_init(self):
         m = self
         for a, b, s in zip(m.box, m.cls, m.stride):
@@ -397,16 +397,96 @@ class DetectionLoss:
         return loss.sum() * bs, loss.detach()
 
 
+def pseudo_labels(outputs, shape):
+    # NMS outputs (xyxy pixels) as targets in the Dataset.collate_fn layout
+    h, w = shape
+    idx, cls, box = [], [], []
+    for i, output in enumerate(outputs):
+        scale = torch.tensor([w, h, w, h], device=output.device,
+                             dtype=output.dtype)
+        # Clipped to the image like Dataset labels
+        xyxy = torch.min(output[:, :4].clamp(min=0), scale)
+        xy = (xyxy[:, 0:2] + xyxy[:, 2:4]) / 2
+        wh = xyxy[:, 2:4] - xyxy[:, 0:2]
+        idx.append(torch.full((len(output),), i, device=output.device))
+        cls.append(output[:, 5:6])
+        box.append(torch.cat((xy, wh), 1) / scale)
+    return {"idx": torch.cat(idx), "cls": torch.cat(cls),
+            "box": torch.cat(box)}
+
+
+class DistillLoss:
+    """
+    Knowledge distillation from a frozen teacher on unlabeled images.
+
+    The teacher's detections above conf_th are the hard targets of the usual
+    DetectionLoss. On top, every anchor matches the teacher's class scores
+    (BCE) and box distributions (KL), weighted by teacher confidence.
+    Student and teacher must share nc and strides, which every
+    yolo_v11_* variant does.
+    """
+
+    def __init__(self, model, teacher, conf_th=0.25, kd=1.0):
+        self.detection = DetectionLoss(model)
+        self.teacher = teacher
+        self.conf_th = conf_th
+        self.kd = kd
+        self.nc = self.detection.nc
+        self.reg_max = self.detection.reg_max
+        self.no = self.detection.no
+        self.bce = nn.BCEWithLogitsLoss(reduction="none")
+
+    @torch.no_grad()
+    def targets(self, images):
+        output, feats = self.teacher(images.to(
+            next(self.teacher.parameters()).dtype))
+        return non_max_suppression(output, self.conf_th, 0.7), feats
+
+    def __call__(self, pred, images):
+        outputs, t_feats = self.targets(images)
+        batch = pseudo_labels(outputs, images.shape[2:])
+        loss, loss_items = self.detection(pred, batch)
+
+        feats = pred[1] if isinstance(pred, tuple) else pred
+        bs = feats[0].shape[0]
+        s = torch.cat([f.view(bs, self.no, -1) for f in feats], 2).float()
+        t = torch.cat([f.view(bs, self.no, -1) for f in t_feats], 2).float()
+        s_box, s_cls = s.split((self.reg_max * 4, self.nc), 1)
+        t_box, t_cls = t.split((self.reg_max * 4, self.nc), 1)
+
+        t_score = t_cls.sigmoid()
+        cls_kd = self.bce(s_cls, t_score).sum() / max(t_score.sum(), 1)
+
+        # Box distributions only matter where the teacher sees something
+        weight = t_score.amax(1)
+        s_dist = s_box.view(bs, 4, self.reg_max, -1).log_softmax(2)
+        t_dist = t_box.view(bs, 4, self.reg_max, -1).softmax(2)
+        box_kd = F.kl_div(s_dist, t_dist, reduction="none").sum(2).mean(1)
+        box_kd = (box_kd * weight).sum() / max(weight.sum(), 1)
+
+        kd = (cls_kd * 0.5 + box_kd * 1.5) * self.kd
+        return loss + kd * bs, torch.cat((loss_items, kd.detach()[None]))
+
+
 # ----------------------- Detection Loss End --------------
 
 # ----------------------- Compute AP Start -----------------
-def non_max_suppression(pred, conf_th=0.001, iou_th=0.7):
+def non_max_suppression(pred, conf_th=0.001, iou_th=0.7, classes=None):
     import torchvision
     max_det = 300
     max_wh = 7680
     max_nms = 30000
 
     pred = pred[0] if isinstance(pred, (list, tuple)) else pred
+    if classes is not None and len(classes) == 0:
+        return [torch.zeros((0, 6), device=pred.device)] * pred.shape[0]
+
+    # Keep only the score rows of whitelisted classes before thresholding
+    class_map = None
+    if classes is not None:
+        class_map = torch.as_tensor(classes, dtype=torch.long,
+                                    device=pred.device)
+        pred = torch.cat((pred[:, :4], pred[:, 4 + class_map]), 1)
 
     bs = pred.shape[0]  # batch size
     nc = pred.shape[1] - 4  # number of classes
@@ -428,10 +508,12 @@ def non_max_suppression(pred, conf_th=0.001, iou_th=0.7):
 
         if nc > 1:
             i, j = torch.where(cls > conf_th)
-            x = torch.cat((box[i], x[i, 4 + j, None], j[:, None].float()), 1)
+            k = j if class_map is None else class_map[j]
+            x = torch.cat((box[i], x[i, 4 + j, None], k[:, None].float()), 1)
         else:  # best class only
             conf, j = cls.max(1, keepdim=True)
-            x = torch.cat((box, conf, j.float()), 1)[conf.view(-1) > conf_th]
+            k = j if class_map is None else class_map[j]
+            x = torch.cat((box, conf, k.float()), 1)[conf.view(-1) > conf_th]
 
         n = x.shape[0]  # number of boxes
         if not n: